@@ -1,12 +1,14 @@
 import os
 import json
 import re
+import asyncio
+import threading
+import orjson
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain.chains import LLMChain
-from langchain_core.prompts import PromptTemplate
 from langchain_groq import ChatGroq
 
-from review import stream_review
+from review import stream_review, stream_review_async
 from qna import prepare_qna_inputs
 
 # -------------------------------
@@ -19,6 +21,18 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # LLM Setup (Groq LLaMA3)
 # -------------------------------
 def get_llm(model_id: str = "llama3-8b-8192", temperature: float = 0, max_tokens: int = 2048):
+    """One shared ChatGroq client per config and event loop, so requests reuse its HTTP connection pool.
+    Keyed by the running loop because the async pool's connections are bound to the loop that opened them.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None  # sync callers, which only use invoke()
+    return _cached_llm(model_id, temperature, max_tokens, loop)
+
+
+@lru_cache(maxsize=8)
+def _cached_llm(model_id: str, temperature: float, max_tokens: int, loop):
     if not GROQ_API_KEY:
         raise ValueError("Missing GROQ_API_KEY in .env")
     return ChatGroq(
@@ -73,7 +87,7 @@ Tool inputs: {tool_inputs}
 # -------------------------------
 REVIEW_SUMMARY_SYSTEM = (
     "You are a senior code reviewer. You will receive raw tool output: "
-    "git diff chunks, list of changed files, flake8 and pylint results, and (optionally) autofix outcomes. "
+    "git diff chunks, list of changed files, flake8 and pylint results (grouped per file and rule code, with a count and sample lines), and (optionally) autofix outcomes. "
     "Produce a STRICT JSON object with keys:\n"
     " - summary: short natural-language summary\n"
     " - issues: array of objects {type: 'lint'|'bug'|'style'|'security'|'other', file, details, line_hint?}\n"
@@ -86,24 +100,56 @@ REVIEW_SUMMARY_SYSTEM = (
 
 REVIEW_SUMMARY_USER_TEMPLATE = """Raw review events (JSON list): {events_json}"""
 
+# Summary used when there is nothing for the LLM to weigh in on
+GREEN_SUMMARY = {
+    "summary": "No issues found.",
+    "issues": [],
+    "suggested_fixes": [],
+    "green_signal": True,
+    "confidence": "high",
+}
 
-def summarize_review_events_with_llm(events: list, model_id: str = "llama3-8b-8192") -> dict:
-    """Ask the LLM to produce a single structured summary JSON from streamed review events."""
-    llm = get_llm(model_id=model_id)
-    events_json = json.dumps(events, indent=2)
 
-    msg = llm.invoke([
+def _summary_messages(events: list) -> list:
+    events_json = orjson.dumps(_compact_events(events)).decode()
+    return [
         {"role": "system", "content": REVIEW_SUMMARY_SYSTEM},
         {"role": "user", "content": REVIEW_SUMMARY_USER_TEMPLATE.format(events_json=events_json)}
-    ])
-    content = getattr(msg, "content", "{}")
+    ]
 
-    # Extract JSON robustly
+
+def _extract_json(text: str):
+    """Parse the first balanced {...} object in text, skipping braces inside strings.
+    Raises ValueError if there is none.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found")
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return orjson.loads(text[start:i + 1])
+    raise ValueError("Unbalanced JSON object")
+
+
+def _parse_summary(content: str) -> dict:
+    """Extract the summary JSON robustly from raw LLM output."""
     try:
-        m = re.search(r'\{.*\}', content, re.S)
-        if m:
-            return json.loads(m.group(0))
-        return json.loads(content)
+        return _extract_json(content)
     except Exception:
         return {
             "summary": "LLM summarization failed to parse. Returning raw content.",
@@ -115,6 +161,102 @@ def summarize_review_events_with_llm(events: list, model_id: str = "llama3-8b-81
         }
 
 
+def summarize_review_events_with_llm(events: list, model_id: str = "llama3-8b-8192") -> dict:
+    """Ask the LLM to produce a single structured summary JSON from streamed review events."""
+    llm = get_llm(model_id=model_id)
+    msg = llm.invoke(_summary_messages(events))
+    return _parse_summary(getattr(msg, "content", "{}"))
+
+
+# flake8: "path:row:col: E225 message", pylint: "path:row:col: W0611: message (symbol)"
+# (?m) inline so the same pattern compiles under google-re2 (linear-time, no backtracking) when it is installed
+_LINT_LINE_PATTERN = r'(?m)^(?P<file>[^:\n]+):(?P<line>\d+):\d+: (?P<code>[A-Z]+\d+):? (?P<details>.*)$'
+try:
+    import re2
+    _LINT_LINE = re2.compile(_LINT_LINE_PATTERN)
+except Exception:  # not installed, or a re2 binding that can't compile the pattern
+    _LINT_LINE = re.compile(_LINT_LINE_PATTERN)
+
+
+def _parse_lint_output(output: str) -> list:
+    """Split raw flake8/pylint output into {file, line, code, details} dicts."""
+    return [m.groupdict() for m in _LINT_LINE.finditer(output or "")]
+
+
+def _compact_events(events: list, max_samples: int = 3) -> list:
+    """Collapse flake8/pylint output into one lint_summary per (tool, stage, file, code)
+    carrying a count and a few sample lines, so one rule firing hundreds of times costs one entry.
+    """
+    compacted, groups = [], {}
+    for e in events:
+        if e.get("type") not in ("lint", "bugcheck"):
+            compacted.append(e)
+            continue
+        findings = _parse_lint_output(e.get("output", ""))
+        if not findings:
+            compacted.append(e)  # clean run, or output we can't parse (e.g. a tool crash)
+            continue
+        for finding in findings:
+            key = (e["type"], e.get("stage"), finding["file"], finding["code"])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    "type": "lint_summary",
+                    "tool": "flake8" if e["type"] == "lint" else "pylint",
+                    "stage": e.get("stage"),
+                    "file": finding["file"],
+                    "code": finding["code"],
+                    "message": finding["details"],
+                    "count": 0,
+                    "sample_lines": [],
+                }
+                compacted.append(group)
+            group["count"] += 1
+            if len(group["sample_lines"]) < max_samples:
+                group["sample_lines"].append(int(finding["line"]))
+    return compacted
+
+
+# Most grouped issues sent to the suggestions prompt (the model has an 8k-token context)
+MAX_SUGGESTION_ISSUES = 20
+
+
+def _extract_lint_issues_from_events(events: list, max_issues: int = MAX_SUGGESTION_ISSUES,
+                                     max_samples: int = 3) -> list:
+    """Predict the summary's issue list directly from linter output, without the LLM.
+    Findings are grouped per (file, code) like _compact_events, keeping the first line as
+    line_hint plus a count and a few more sample lines; at most max_issues groups are kept.
+    """
+    groups = {}
+    for e in events:
+        if e.get("type") not in ("lint", "bugcheck") or e.get("stage") == "after_fix":
+            continue
+        for finding in _parse_lint_output(e.get("output", "")):
+            key = (finding["file"], finding["code"])
+            issue = groups.get(key)
+            if issue is None:
+                if len(groups) >= max_issues:
+                    continue
+                issue = groups[key] = {
+                    "type": "lint" if e["type"] == "lint" else "bug",
+                    "file": finding["file"],
+                    "details": f"{finding['code']} {finding['details']}",
+                    "line_hint": int(finding["line"]),
+                    "count": 0,
+                    "sample_lines": [],
+                }
+            issue["count"] += 1
+            if len(issue["sample_lines"]) < max_samples:
+                issue["sample_lines"].append(int(finding["line"]))
+    return list(groups.values())
+
+
+def _is_trivially_green(events: list) -> bool:
+    """True when there is no diff to review. A clean lint run isn't enough: linters only see
+    Python files, and the summary is what judges everything else in the change."""
+    return not any(e.get("type") == "diff" for e in events)
+
+
 def format_review_output(summary: dict, events: list, auto_fix: bool = False, suggestions_text: str | None = None) -> str:
     """Convert structured review JSON + raw events into a friendly, conversational explanation."""
     lines = []
@@ -199,15 +341,8 @@ def format_review_output(summary: dict, events: list, auto_fix: bool = False, su
     return "\n".join(lines)
 
 
-def generate_suggestions_from_events(summary: dict, events: list, model_id: str = "llama3-8b-8192") -> str:
-    """Use the original diff and detected issues to propose specific code corrections.
-    The LLM should output concise suggestions and corrected code blocks. If a file is large,
-    focus on the impacted function or the minimal hunk that fixes the issue.
-    """
-    llm = get_llm(model_id=model_id)
-
-    issues = summary.get("issues", [])
-    original_diff = next((e.get("diff") for e in events if e.get("type") == "original_diff"), "")
+def _suggestion_messages(issues: list, events: list) -> list:
+    original_diff = "".join(e.get("diff", "") for e in events if e.get("type") == "diff")
 
     prompt = (
         "You are a senior code reviewer. I will give you issues (with file and line hints) and a git diff.\n"
@@ -224,38 +359,116 @@ def generate_suggestions_from_events(summary: dict, events: list, model_id: str
         "- Use a tiny fenced code block with the appropriate language tag (e.g., ```python).\n"
         "- If a line number is given, you may include 1-3 lines of context above/below.\n"
         "- Keep output concise and copy-pasteable.\n\n"
-        f"Issues (JSON):\n{json.dumps(issues, indent=2)}\n\n"
+        f"Issues (JSON, one per file and rule; count is how often it fires, sample_lines where):\n"
+        f"{orjson.dumps(issues).decode()}\n\n"
         f"Git diff (for your reference):\n```diff\n{original_diff[:8000]}\n```\n\n"
         "Now provide the suggestions in the specified format."
     )
+    return [
+        {"role": "system", "content": "You are an expert reviewer. Respond with concise, helpful suggestions and code blocks only."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_suggestions_from_events(summary: dict, events: list, model_id: str = "llama3-8b-8192") -> str:
+    """Use the original diff and detected issues to propose specific code corrections.
+    The LLM should output concise suggestions and corrected code blocks. If a file is large,
+    focus on the impacted function or the minimal hunk that fixes the issue.
+    """
+    llm = get_llm(model_id=model_id)
+    try:
+        msg = llm.invoke(_suggestion_messages(summary.get("issues", []), events))
+        return getattr(msg, "content", str(msg))
+    except Exception as e:
+        return f"(Could not generate suggestions: {e})"
+
 
+async def _agenerate_suggestions(llm, issues: list, events: list) -> str:
     try:
-        msg = llm.invoke([
-            {"role": "system", "content": "You are an expert reviewer. Respond with concise, helpful suggestions and code blocks only."},
-            {"role": "user", "content": prompt}
-        ])
+        msg = await llm.ainvoke(_suggestion_messages(issues, events))
         return getattr(msg, "content", str(msg))
     except Exception as e:
         return f"(Could not generate suggestions: {e})"
 
 
-def run_code_review(repo_url: str, auto_fix: bool = False, staged: bool = False, model_id: str = "llama3-8b-8192"):
-    """Execute the review tool, collect events, and produce an LLM summary.
-    If auto_fix=True, stream_review will attempt autopep8 fixes and re-check.
+async def _summarize_review_async(events: list, auto_fix: bool = False, model_id: str = "llama3-8b-8192"):
+    """Turn collected review events into (summary, formatted) via the LLM.
+    The summary and suggestion calls run concurrently: suggestions are seeded with
+    issues parsed from the linter output instead of waiting for the summary.
+    Reviews with no diff skip the LLM entirely; lint-clean ones skip only the suggestions.
     """
-    events = list(stream_review(repo_url, auto_fix=auto_fix, staged=staged))
-    summary = summarize_review_events_with_llm(events, model_id=model_id)
+    if _is_trivially_green(events):
+        summary = dict(GREEN_SUMMARY)
+        return summary, format_review_output(summary, events, auto_fix=auto_fix)
+
+    llm = get_llm(model_id=model_id)
 
-    # Generate suggestions only when auto-fix is off and issues exist
+    # Generate suggestions only when auto-fix is off and the linters found something
+    issues_preview = [] if auto_fix else _extract_lint_issues_from_events(events)
+    calls = [llm.ainvoke(_summary_messages(events))]
+    if issues_preview:
+        calls.append(_agenerate_suggestions(llm, issues_preview, events))
+    results = await asyncio.gather(*calls)
+
+    summary = _parse_summary(getattr(results[0], "content", "{}"))
     issues = summary.get("issues", []) if isinstance(summary, dict) else []
-    suggestions_text = None
-    if (not auto_fix) and issues:
-        suggestions_text = generate_suggestions_from_events(summary, events, model_id=model_id)
+    suggestions_text = results[1] if issues and len(results) > 1 else None
 
     human_readable = format_review_output(summary, events, auto_fix=auto_fix, suggestions_text=suggestions_text)
+    return summary, human_readable
+
+
+async def run_code_review_async(repo_url: str, auto_fix: bool = False, staged: bool = False, model_id: str = "llama3-8b-8192",
+                                refresh: bool = False):
+    """Execute the review tool, collect events, and produce an LLM summary.
+    If auto_fix=True, stream_review will attempt autopep8 fixes and re-check.
+    """
+    events = [e async for e in stream_review_async(repo_url, auto_fix=auto_fix, staged=staged, refresh=refresh)]
+    summary, human_readable = await _summarize_review_async(events, auto_fix=auto_fix, model_id=model_id)
     return {"events": events, "summary": summary, "formatted": human_readable}
 
 
+@lru_cache(maxsize=1)
+def _blocking_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived loop for run_code_review, so its LLM clients aren't tied to a loop that asyncio.run closed."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="review-blocking-loop", daemon=True).start()
+    return loop
+
+
+def run_code_review(repo_url: str, auto_fix: bool = False, staged: bool = False, model_id: str = "llama3-8b-8192",
+                    refresh: bool = False):
+    """Blocking wrapper around run_code_review_async (call from sync code / worker threads)."""
+    future = asyncio.run_coroutine_threadsafe(
+        run_code_review_async(repo_url, auto_fix=auto_fix, staged=staged, model_id=model_id, refresh=refresh),
+        _blocking_loop(),
+    )
+    return future.result()
+
+
+def _sse(kind: str, data) -> str:
+    return f"data: {json.dumps({'type': kind, 'data': data})}\n\n"
+
+
+async def run_code_review_stream(repo_url: str, auto_fix: bool = False, staged: bool = False, model_id: str = "llama3-8b-8192",
+                                 refresh: bool = False):
+    """Same as run_code_review, but yields server-sent events as the review runs:
+    one {"type": "event"} per review event, then {"type": "summary"} and {"type": "formatted"}.
+    Errors are reported in-band as {"type": "error"} since the response has already started.
+    """
+    events = []
+    try:
+        async for event in stream_review_async(repo_url, auto_fix=auto_fix, staged=staged, refresh=refresh):
+            events.append(event)
+            yield _sse("event", event)
+
+        summary, human_readable = await _summarize_review_async(events, auto_fix=auto_fix, model_id=model_id)
+        yield _sse("summary", summary)
+        yield _sse("formatted", human_readable)
+    except Exception as e:
+        yield _sse("error", str(e))
+
+
 # -------------------------------
 # Main Agent Runner (kept)
 # -------------------------------
@@ -269,25 +482,17 @@ def run_agent(task_type: str, repo_url=None, query=None, auto_fix=False):
     else:
         raise ValueError("Invalid task_type: must be 'qna' or 'review'")
 
-    template = PromptTemplate(
-        input_variables=["request", "tool_inputs"],
-        template=AGENT_PROMPT
-    )
-
-    llm = get_llm()
-    chain = LLMChain(llm=llm, prompt=template)
-
-    response = chain.run(
+    prompt = AGENT_PROMPT.format(
         request=query if task_type == "qna" else "Review this patch",
-        tool_inputs=json.dumps(tool_inputs, indent=2)
+        tool_inputs=orjson.dumps(tool_inputs).decode()
     )
+    msg = get_llm().invoke([{"role": "user", "content": prompt}])
+    response = getattr(msg, "content", "")
 
     if task_type == "review":
         try:
-            m = re.search(r'(\{.*\})', response, re.S)
-            if m:
-                return json.loads(m.group(1))
-        except Exception:
+            return _extract_json(response)
+        except ValueError:
             return {"raw": response}
 
     return response
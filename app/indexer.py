@@ -1,19 +1,30 @@
 # app/indexer.py
 import os
-import subprocess
-import hashlib
+import json
+import logging
+import base64
+import shutil
+import blake3
+import pygit2
+import zstandard
+import numpy as np
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 import chromadb
+from chromadb import Documents, EmbeddingFunction, Embeddings
 from ingest import find_docs
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 # ---- Paths (Windows-safe absolute paths) ----
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 CHROMA_DIR = os.path.join(BASE_DIR, "chroma_db")
 REPOS_DIR = os.path.join(BASE_DIR, "repos")
+DOCCACHE_DIR = os.path.join(CHROMA_DIR, "_doccache")  # find_docs output per collection + commit
 
-print(f"[DEBUG] Using CHROMA_DIR: {CHROMA_DIR}")
-print(f"[DEBUG] Using REPOS_DIR: {REPOS_DIR}")
+logger.debug("Using CHROMA_DIR: %s", CHROMA_DIR)
+logger.debug("Using REPOS_DIR: %s", REPOS_DIR)
 
 os.makedirs(CHROMA_DIR, exist_ok=True)
 os.makedirs(REPOS_DIR, exist_ok=True)
@@ -25,58 +36,120 @@ client = chromadb.PersistentClient(path=CHROMA_DIR)
 model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
 EMB_DIM = len(model.encode("test"))
 RESET_THRESHOLD = float(os.getenv("CHROMA_RESET_THRESHOLD", "0.6"))  # if >60% broken → reset
+# Embeddings are unit-length, so cosine distance reduces to a dot product
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+class _SharedModelEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Lets Chroma embed documents/queries itself, reusing the model loaded above."""
+
+    def __init__(self):
+        # Chroma warns about embedding functions without their own __init__; there's no state to set up
+        pass
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(model.encode(
+            list(input), batch_size=64, convert_to_numpy=True,
+            normalize_embeddings=True, show_progress_bar=False,
+        ))
+
+embedding_fn = _SharedModelEmbeddingFunction()
+
+# Chunk text is stored zstd-compressed in metadata["z"]; documents only hold a short preview
+PREVIEW_CHARS = 120
+_cctx = zstandard.ZstdCompressor(level=3)
+_dctx = zstandard.ZstdDecompressor()
 
 # ------------------------
 # Repo management
 # ------------------------
-def get_repo_path(repo_url: str, base_dir: str = REPOS_DIR) -> str:
+def _fast_forward(repo: pygit2.Repository) -> None:
+    """Fetch origin and fast-forward the checked-out branch to its remote counterpart."""
+    repo.remotes["origin"].fetch()
+    try:
+        target = repo.lookup_reference("refs/remotes/origin/HEAD").resolve()
+    except KeyError:
+        target = repo.lookup_reference(f"refs/remotes/origin/{repo.head.shorthand}")
+    if target.target == repo.head.target:
+        return
+    repo.checkout_tree(repo.get(target.target))
+    repo.head.set_target(target.target)
+
+def sync_repo(repo_url: str, base_dir: str = REPOS_DIR) -> Tuple[str, Optional[str], Optional[str]]:
+    """Clone or pull the repo. Returns (repo_path, head_before, head_after); head_before is None on clone."""
     os.makedirs(base_dir, exist_ok=True)
     repo_name = repo_url.rstrip("/").split("/")[-1].replace(".git", "")
     repo_path = os.path.join(base_dir, repo_name)
 
     if not os.path.exists(repo_path):
         print(f"[INFO] Cloning {repo_url} into {repo_path}")
-        subprocess.run(["git", "clone", repo_url, repo_path], check=True)
-    else:
-        print(f"[INFO] Repo already exists at {repo_path}, pulling latest changes...")
-        try:
-            subprocess.run(["git", "-C", repo_path, "pull"], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"[WARN] Could not pull latest changes for {repo_url}: {e}")
+        repo = pygit2.clone_repository(repo_url, repo_path)
+        return repo_path, None, str(repo.head.target)
+
+    print(f"[INFO] Repo already exists at {repo_path}, pulling latest changes...")
+    repo = pygit2.Repository(repo_path)
+    pre_sha = str(repo.head.target)
+    try:
+        _fast_forward(repo)
+    except (pygit2.GitError, KeyError) as e:
+        print(f"[WARN] Could not pull latest changes for {repo_url}: {e}")
+    return repo_path, pre_sha, str(repo.head.target)
 
-    return repo_path
+def get_repo_path(repo_url: str, base_dir: str = REPOS_DIR) -> str:
+    return sync_repo(repo_url, base_dir)[0]
 
 # ------------------------
 # Helpers
 # ------------------------
 def chunk_text(text: str, max_chars: int = 1000) -> List[str]:
     paragraphs = text.split("\n\n")
-    chunks, cur = [], ""
-    for p in paragraphs:
-        if len(cur) + len(p) > max_chars:
-            if cur.strip():
-                chunks.append(cur.strip())
-            cur = p
-        else:
-            cur += ("\n\n" if cur else "") + p
-    if cur.strip():
-        chunks.append(cur.strip())
+    # cum[i] = total length of paragraphs[:i+1], counting a 2-char separator after each
+    cum = np.fromiter((len(p) + 2 for p in paragraphs), dtype=np.int64, count=len(paragraphs)).cumsum()
+    chunks, start = [], 0
+    while start < len(paragraphs):
+        base = cum[start - 1] if start else 0
+        # Paragraphs keep joining while len(chunk) + len(next) <= max_chars
+        end = max(int(np.searchsorted(cum, base + max_chars + 4, side="right")), start + 1)
+        chunk = "\n\n".join(paragraphs[start:end]).strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
     return chunks
 
 def make_chunk_id(repo_url: str, file_path: str, chunk_text_: str) -> str:
     raw = f"{repo_url}|{file_path}|{chunk_text_}".encode("utf-8")
-    return hashlib.sha1(raw).hexdigest()
+    return blake3.blake3(raw).hexdigest(length=20)
+
+def _compress_chunk(chunk: str) -> str:
+    return base64.b64encode(_cctx.compress(chunk.encode("utf-8"))).decode("ascii")
+
+def _decompress_chunk(blob: str) -> str:
+    return _dctx.decompress(base64.b64decode(blob)).decode("utf-8")
 
 def _collection_name(repo_url: str) -> str:
     return repo_url.replace("https://", "").replace("http://", "").replace("/", "_")
 
+def _is_cosine(col) -> bool:
+    return (col.metadata or {}).get("hnsw:space") == "cosine"
+
 def _get_or_create_collection(name: str):
     try:
-        return client.get_collection(name=name)
-    except Exception:
-        return client.create_collection(name=name)
-
-def _batched(seq: List[str], n: int) -> List[List[str]]:
+        col = client.get_or_create_collection(
+            name=name, embedding_function=embedding_fn, metadata=COLLECTION_METADATA
+        )
+        if _is_cosine(col):
+            return col
+        # Older collections use the default L2 space over unnormalized embeddings
+        print(f"[WARN] Collection '{name}' is not a cosine index. Recreating it.")
+    except ValueError as e:
+        # Collections persisted with Chroma's default embedding function conflict with ours
+        print(f"[WARN] Could not open collection '{name}': {e}. Recreating it.")
+    _reset_collection(name)
+    return client.create_collection(name=name, embedding_function=embedding_fn, metadata=COLLECTION_METADATA)
+
+def _doccache_path(collection_name: str, sha: str) -> str:
+    return os.path.join(DOCCACHE_DIR, collection_name, f"{sha}.json")
+
+def _batched(seq: list, n: int) -> Iterator[list]:
     for i in range(0, len(seq), n):
         yield seq[i : i + n]
 
@@ -84,30 +157,45 @@ def _batched(seq: List[str], n: int) -> List[List[str]]:
 # Indexing with auto-reset
 # ------------------------
 def index_repo(repo_url: str) -> bool:
-    repo_path = get_repo_path(repo_url)
-    docs = find_docs(repo_path)
+    repo_path, pre_sha, post_sha = sync_repo(repo_url)
     collection_name = _collection_name(repo_url)
+    # Opened first: an outdated collection is reset here, which also drops its sidecars
+    col = _get_or_create_collection(collection_name)
+
+    # Nothing pulled and this commit was already indexed → nothing to do
+    sidecar = _doccache_path(collection_name, post_sha) if post_sha else None
+    if sidecar and os.path.exists(sidecar):
+        if pre_sha == post_sha and col.count() > 0:
+            print(f"[INFO] {repo_url} unchanged at {post_sha[:12]}; skipping re-index")
+            return True
+        with open(sidecar, "r", encoding="utf-8") as fh:
+            docs = json.load(fh)
+    else:
+        docs = find_docs(repo_path)
 
-    print(f"[DEBUG] Indexing repo: {repo_url}")
+    logger.debug("Indexing repo: %s", repo_url)
     if not docs:
         print("[WARN] No documents found to index!")
         return False
 
     # Build the full worklist once (ids + content)
     worklist: List[Tuple[str, str, str]] = []  # (fname, chunk, chunk_id)
+    seen_ids = set()
     for fname, text in docs.items():
         chunks = chunk_text(text)
         for chunk in chunks:
             cid = make_chunk_id(repo_url, fname, chunk)
+            if cid in seen_ids:
+                continue  # identical chunk repeated in a file; batch upserts reject duplicate ids
+            seen_ids.add(cid)
             worklist.append((fname, chunk, cid))
 
-    col = _get_or_create_collection(collection_name)
-
     # Pass 1: assess existing embeddings in batches to detect corruption
     existing_ids = [cid for _, _, cid in worklist]
     broken, ok = 0, 0
+    healthy_ids, stale_ids = set(), set()  # stale = stored with a bad embedding
 
-    print(f"[DEBUG] Assessing existing embeddings for {len(existing_ids)} chunks...")
+    logger.debug("Assessing existing embeddings for %s chunks...", len(existing_ids))
     for batch in _batched(existing_ids, 256):
         try:
             existing = col.get(ids=batch, include=["embeddings"])
@@ -118,6 +206,8 @@ def index_repo(repo_url: str) -> bool:
             col = _get_or_create_collection(collection_name)
             broken = len(existing_ids)
             ok = 0
+            healthy_ids.clear()
+            stale_ids.clear()
             break
 
         ids = existing.get("ids", [])
@@ -128,52 +218,56 @@ def index_repo(repo_url: str) -> bool:
             emb = by_id.get(cid)
             if emb is None or len(emb) != EMB_DIM:
                 broken += 1
+                if cid in by_id:
+                    stale_ids.add(cid)
             else:
                 ok += 1
+                healthy_ids.add(cid)
 
     total_seen = broken + ok
     broken_ratio = (broken / total_seen) if total_seen else 0.0
-    print(f"[DEBUG] Existing check → ok={ok}, broken={broken}, broken_ratio={broken_ratio:.2f}")
+    logger.debug("Existing check → ok=%s, broken=%s, broken_ratio=%.2f", ok, broken, broken_ratio)
 
     # If most are broken, drop & recreate collection
     if total_seen > 0 and broken_ratio >= RESET_THRESHOLD:
         print(f"[INFO] Broken ratio {broken_ratio:.2f} >= {RESET_THRESHOLD:.2f}. Resetting collection '{collection_name}'.")
         _reset_collection(collection_name)
         col = _get_or_create_collection(collection_name)
+        healthy_ids.clear()
+        stale_ids.clear()
+
+    # Pass 2: everything Pass 1 didn't find healthy gets (re)embedded; no extra reads
+    to_embed = [item for item in worklist if item[2] not in healthy_ids]
+    added = 0
+    skipped = len(worklist) - len(to_embed)
+    repaired = sum(1 for _, _, cid in to_embed if cid in stale_ids)
+
+    # Upsert in batches, embedding each batch's full text in one forward pass
+    for batch in _batched(to_embed, 256):
+        chunks = [chunk for _, chunk, _ in batch]
+        col.upsert(
+            documents=[chunk[:PREVIEW_CHARS] for chunk in chunks],
+            embeddings=embedding_fn(chunks),
+            metadatas=[
+                {"repo": repo_url, "path": fname.lower(), "z": _compress_chunk(chunk)}
+                for fname, chunk, _ in batch
+            ],
+            ids=[cid for _, _, cid in batch],
+        )
+    added = len(to_embed)
 
-    # Pass 2: upsert all missing/mismatched (or everything after reset)
-    added, skipped, repaired = 0, 0, 0
-    for fname, chunk, cid in worklist:
-        needs_update = True
+    if logger.isEnabledFor(logging.DEBUG):
         try:
-            existing = col.get(ids=[cid], include=["embeddings"])
-            if existing and existing.get("ids"):
-                emb0 = (existing.get("embeddings") or [None])[0]
-                if emb0 is not None and len(emb0) == EMB_DIM:
-                    skipped += 1
-                    needs_update = False
-                else:
-                    repaired += 1
-        except Exception:
-            pass
-
-        if needs_update:
-            emb = model.encode(chunk).tolist()
-            metadata = {"repo": repo_url, "path": fname.lower()}
-            col.upsert(
-                documents=[chunk],
-                metadatas=[metadata],
-                ids=[cid],
-                embeddings=[emb],
-            )
-            added += 1
-
-    try:
-        print(f"[DEBUG] Final collection count: {col.count()}")
-    except Exception as e:
-        print(f"[WARN] col.count() failed: {e}")
+            logger.debug("Final collection count: %s", col.count())
+        except Exception as e:
+            print(f"[WARN] col.count() failed: {e}")
 
     print(f"[INFO] Indexed {added} new, repaired {repaired}, skipped {skipped} chunks for {repo_url}")
+
+    if sidecar:
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        with open(sidecar, "w", encoding="utf-8") as fh:
+            json.dump(docs, fh)
     return True
 
 def _reset_collection(collection_name: str):
@@ -182,40 +276,54 @@ def _reset_collection(collection_name: str):
         print(f"[INFO] Deleted collection: {collection_name}")
     except Exception as e:
         print(f"[WARN] delete_collection failed (may be fine if not exists): {e}")
+    shutil.rmtree(os.path.join(DOCCACHE_DIR, collection_name), ignore_errors=True)
 
 # ------------------------
 # Retrieval
 # ------------------------
-def retrieve_docs(repo_url: str, query: str, top_k: int = 5):
+@lru_cache(maxsize=1024)
+def _encode_query_cached(query: str) -> tuple:
+    return tuple(model.encode(query, normalize_embeddings=True).tolist())
+
+def encode_query(query: str) -> List[float]:
+    """Embed a user query; repeated queries skip the model forward pass."""
+    return list(_encode_query_cached(query))
+
+def retrieve_docs(repo_url: str, query: str, top_k: int = 5, query_emb=None):
     collection_name = _collection_name(repo_url)
-    print(f"[DEBUG] Collection name: {collection_name}")
+    logger.debug("Collection name: %s", collection_name)
     try:
-        col = client.get_collection(name=collection_name)
+        col = client.get_collection(name=collection_name, embedding_function=embedding_fn)
+        if not _is_cosine(col):
+            raise ValueError("collection predates cosine indexing")
     except Exception as e:
         print(f"[WARN] Could not open collection: {e}. Re-indexing…")
-        col = client.create_collection(name=collection_name)
+        col = _get_or_create_collection(collection_name)
         if not index_repo(repo_url):
             print("[ERROR] Failed to index repository")
             return []
 
-    query_emb = model.encode(query).tolist()
+    # Reuse a caller-provided embedding; otherwise go through the shared query LRU
+    if query_emb is None:
+        query_emb = encode_query(query)
+    query_embeddings = [np.asarray(query_emb, dtype=np.float32)]
     try:
-        print("[DEBUG] Running col.query …")
+        logger.debug("Running col.query …")
         results = col.query(
-            query_embeddings=[query_emb],
+            query_embeddings=query_embeddings,
             n_results=top_k,
             include=["documents", "metadatas", "distances"],
         )
-        print("[DEBUG] col.query completed")
+        logger.debug("col.query completed")
     except Exception as e:
         print(f"[ERROR] Query failed: {e}. Attempting one-time reset + reindex.")
         # One-time recovery: reset & reindex then retry once
         _reset_collection(collection_name)
-        col = client.create_collection(name=collection_name)
+        col = _get_or_create_collection(collection_name)
         if index_repo(repo_url):
             try:
                 results = col.query(
-                    query_embeddings=[query_emb],
+                    query_embeddings=query_embeddings,
                     n_results=top_k,
                     include=["documents", "metadatas", "distances"],
                 )
@@ -226,10 +334,13 @@ def retrieve_docs(repo_url: str, query: str, top_k: int = 5):
             return []
 
     if not results.get("documents") or not results["documents"][0]:
-        print("[DEBUG] No documents returned.")
+        logger.debug("No documents returned.")
         return []
 
-    return [
-        {"text": doc, "metadata": meta}
-        for doc, meta in zip(results["documents"][0], results["metadatas"][0])
-    ]
+    hits = []
+    for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
+        meta = dict(meta or {})
+        blob = meta.pop("z", None)
+        # Chunks indexed before compression keep their full text in documents
+        hits.append({"text": _decompress_chunk(blob) if blob else doc, "metadata": meta})
+    return hits
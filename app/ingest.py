@@ -1,32 +1,66 @@
 # app/ingest.py
 import tempfile, os, shutil
+import logging
 from git import Repo
 
+logger = logging.getLogger(__name__)
+
 def clone_repo(git_url, branch="main"):
     tmpdir = tempfile.mkdtemp(prefix="repo_")
     Repo.clone_from(git_url, tmpdir, branch=branch)
     return tmpdir
 
+CANDIDATES = frozenset({"contributing.md", "contributing.rst", "readme.md", "readme"})
+# Dependency/build trees that never hold the project's own docs
+SKIP_DIRS = frozenset({".git", "node_modules", ".venv", "venv", "__pycache__", "dist", "build", ".tox"})
+
+def _walk_candidates(path):
+    """Yield candidate doc paths under path (files first, then subdirectories, like os.walk)."""
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        subdirs.append(entry.path)
+                elif entry.name.lower() in CANDIDATES:
+                    yield entry.path
+    except OSError as e:
+        print(f"[WARN] Could not scan {path}: {e}")
+        return
+    for sub in subdirs:
+        yield from _walk_candidates(sub)
+
+def _read_doc(p):
+    """Content of a doc file, or None (with a warning) if it can't be read."""
+    try:
+        with open(p, "r", encoding="utf-8") as fh:
+            content = fh.read()
+    except Exception as e:
+        print(f"[WARN] Could not read {p}: {e}")
+        return None
+    logger.debug("Found doc: %s (size: %s chars)", p, len(content))
+    return content
+
+def iter_docs(repo_path):
+    """Yield (name, content) for the docs under repo_path, reading each file only when
+    the consumer asks for it. The walk runs first so the last readable file with a name wins."""
+    paths = {}
+    for p in _walk_candidates(repo_path):
+        paths.setdefault(os.path.basename(p).lower(), []).append(p)
+    for name, candidates in paths.items():
+        for p in reversed(candidates):
+            content = _read_doc(p)
+            if content is not None:
+                yield name, content
+                break
+
 def find_docs(repo_path):
-    candidates = ["contributing.md","contributing.rst","readme.md","readme"]
-    found = {}
-    
-    print(f"[DEBUG] Searching for docs in: {repo_path}")
+    logger.debug("Searching for docs in: %s", repo_path)
     
-    for root, dirs, files in os.walk(repo_path):
-        for f in files:
-            if f.lower() in candidates:
-                p = os.path.join(root, f)
-                try:
-                    with open(p, "r", encoding="utf-8") as fh:
-                        content = fh.read()
-                        found[f.lower()] = content
-                        print(f"[DEBUG] Found doc: {p} (size: {len(content)} chars)")
-                except Exception as e:
-                    print(f"[WARN] Could not read {p}: {e}")
+    found = dict(iter_docs(repo_path))
     
-    print(f"[DEBUG] Found related docs: {list(found.keys())}")
-    print(f"[DEBUG] Total docs found: {len(found)}")
+    logger.debug("Found related docs: %s", list(found.keys()))
+    logger.debug("Total docs found: %s", len(found))
     
     return found
-
@@ -0,0 +1,66 @@
+# app/lint_cache.py
+import os
+import hashlib
+import subprocess
+from functools import lru_cache
+from importlib.metadata import version, PackageNotFoundError
+from typing import Optional
+
+import diskcache
+
+LINT_CACHE_DIR = os.getenv("LINT_CACHE_DIR", os.path.expanduser("~/.cache/ai-code-review-agent/lint"))
+LINT_CACHE_SIZE = int(os.getenv("LINT_CACHE_SIZE", str(256 * 1024 * 1024)))  # bytes on disk
+
+# Repo files that change what flake8/pylint report
+CONFIG_FILES = (".flake8", "setup.cfg", "tox.ini", ".pylintrc", "pylintrc", "pyproject.toml")
+
+
+@lru_cache(maxsize=1)
+def _cache() -> diskcache.Cache:
+    return diskcache.Cache(LINT_CACHE_DIR, size_limit=LINT_CACHE_SIZE)
+
+
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """Installed version of a linter, resolved once per process."""
+    try:
+        return version(tool)
+    except PackageNotFoundError:
+        try:
+            out = subprocess.run([tool, "--version"], capture_output=True, text=True).stdout
+        except OSError:
+            return "unknown"
+        return out.strip().splitlines()[0] if out.strip() else "unknown"
+
+
+def config_fingerprint(repo_dir: str) -> str:
+    h = hashlib.sha256()
+    for name in CONFIG_FILES:
+        try:
+            with open(os.path.join(repo_dir, name), "rb") as fh:
+                h.update(name.encode() + b"\0" + fh.read() + b"\0")
+        except OSError:
+            continue
+    return h.hexdigest()[:16]
+
+
+def file_keys(tool: str, options: str, repo_dir: str, files: list) -> dict:
+    """Cache key per file: tool version + options + repo config + path + content hash.
+    A file that can't be read maps to None (left for the tool to report)."""
+    prefix = f"{tool}:{tool_version(tool)}:{options}:{config_fingerprint(repo_dir)}"
+    keys = {}
+    for path in files:
+        try:
+            with open(os.path.join(repo_dir, path), "rb") as fh:
+                keys[path] = f"{prefix}:{path}:{hashlib.sha256(fh.read()).hexdigest()}"
+        except OSError:
+            keys[path] = None
+    return keys
+
+
+def lookup(key: str) -> Optional[dict]:
+    return _cache().get(key)
+
+
+def store(key: str, result: dict):
+    _cache().set(key, result)
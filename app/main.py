@@ -1,15 +1,24 @@
 # app/main.py
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List
 import uvicorn
 import os
+import gc
+import logging
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+
+# Configure logging before local modules log at import time (LOGLEVEL=DEBUG for indexing detail)
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "WARNING"))
 
 # Local imports
-from agent import call_llm, run_code_review
-from qna import prepare_qna_inputs
-from indexer import get_repo_path, _reset_collection, _collection_name
+from agent import call_llm, run_code_review, run_code_review_stream
+from qna import prepare_qna_inputs, invalidate_repo
+from indexer import encode_query, _reset_collection, _collection_name, BASE_DIR, CHROMA_DIR, EMB_DIM
+from semcache import SemanticCache
 
 
 # -----------------------------
@@ -31,6 +40,34 @@ app.add_middleware(
 )
 
 
+# -----------------------------
+# Startup
+# -----------------------------
+@app.on_event("startup")
+def setup_llm_caching():
+    """Memoize every LLM call on its exact prompt (all our calls use temperature=0)."""
+    database_path = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DIR, ".langchain.db"))
+    set_llm_cache(SQLiteCache(database_path=database_path))
+    print(f"[INFO] LLM cache at {database_path}")
+
+
+@app.on_event("startup")
+def freeze_startup_objects():
+    """Move everything allocated while loading (models, clients) out of the GC's reach."""
+    gc.collect()
+    gc.freeze()
+
+
+# Semantic cache of QnA answers (persisted next to the Chroma data)
+qna_cache = SemanticCache(path=os.path.join(CHROMA_DIR, "semcache.sqlite3"), dim=EMB_DIM)
+
+
+@app.on_event("shutdown")
+def flush_qna_cache():
+    """Persist hit recency the semantic cache buffered in memory."""
+    qna_cache.flush()
+
+
 # -----------------------------
 # Root
 # -----------------------------
@@ -57,6 +94,7 @@ class ReviewRequest(BaseModel):
     repo_url: str = Field(..., description="Git repository URL")
     staged: bool = Field(False, description="If true, review only staged changes")
     auto_fix: bool = Field(False, description="If true, apply autopep8 fixes")
+    refresh: bool = Field(False, description="If true, fetch and fast-forward the cached clone before reviewing")
 
 
 class ReviewResponse(BaseModel):
@@ -83,10 +121,18 @@ def health():
 @app.post("/qna", response_model=QnaResponse)
 def qna(req: QnaRequest):
     try:
-        repo_path = get_repo_path(req.repo_url)
-        _ = repo_path  # Ensure repo exists
-
-        prepared = prepare_qna_inputs(req.repo_url, req.query)
+        # Exact-match fast path, then semantic lookup on the query embedding
+        cached = qna_cache.get(req.repo_url, req.top_k, req.query)
+        query_emb = None
+        if cached is None:
+            query_emb = encode_query(req.query)
+            cached = qna_cache.search(req.repo_url, req.top_k, query_emb)
+        if cached is not None:
+            answer, top_chunks = cached
+            return QnaResponse(answer=answer, top_chunks=top_chunks)
+
+        # prepare_qna_inputs clones/pulls and indexes the repo when needed
+        prepared = prepare_qna_inputs(req.repo_url, req.query, query_emb=query_emb)
         top_chunks = prepared.get("context", [])[:req.top_k]
 
         context_text = "\n\n---\n\n".join(
@@ -110,6 +156,8 @@ def qna(req: QnaRequest):
         """
 
         answer = call_llm(prompt)
+        if top_chunks and not answer.startswith("ERROR:"):
+            qna_cache.put(req.repo_url, req.top_k, req.query, query_emb, answer, top_chunks)
         return QnaResponse(answer=answer, top_chunks=top_chunks)
 
     except Exception as e:
@@ -117,15 +165,30 @@ def qna(req: QnaRequest):
 
 
 # -----------------------------
-# Review Endpoint
+# Review Endpoints
 # -----------------------------
-@app.post("/review", response_model=ReviewResponse)
+@app.post("/review")
 def review(req: ReviewRequest):
+    """Stream review events as server-sent events, ending with the summary and formatted text."""
+    return StreamingResponse(
+        run_code_review_stream(
+            repo_url=req.repo_url,
+            auto_fix=req.auto_fix,
+            staged=req.staged,
+            refresh=req.refresh
+        ),
+        media_type="text/event-stream"
+    )
+
+
+@app.post("/review/blocking", response_model=ReviewResponse)
+def review_blocking(req: ReviewRequest):
     try:
         result = run_code_review(
             repo_url=req.repo_url,
             auto_fix=req.auto_fix,
-            staged=req.staged
+            staged=req.staged,
+            refresh=req.refresh
         )
         return ReviewResponse(
             summary=result["summary"],
@@ -144,6 +207,8 @@ def reset_chromadb(req: ResetRequest):
     try:
         collection_name = _collection_name(req.repo_url)
         _reset_collection(collection_name)
+        qna_cache.invalidate(req.repo_url)
+        invalidate_repo(req.repo_url)
         return {"status": f"reset collection '{collection_name}' done"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
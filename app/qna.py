@@ -1,29 +1,61 @@
 # app/qna.py
 from indexer import index_repo, retrieve_docs, get_repo_path
+from cachetools import TTLCache
 import os
+import threading
 
-def prepare_qna_inputs(repo_url: str, query: str):
+QNA_CACHE_TTL = int(os.getenv("QNA_CACHE_TTL", "60"))  # seconds a (repo, query) result is reused
+INDEX_TTL = int(os.getenv("INDEX_TTL", "300"))  # seconds before a repo is pulled/re-checked again
+
+_qna_cache = TTLCache(maxsize=512, ttl=QNA_CACHE_TTL)
+_recently_indexed = TTLCache(maxsize=256, ttl=INDEX_TTL)
+_lock = threading.Lock()
+
+def prepare_qna_inputs(repo_url: str, query: str, query_emb=None):
     """
     Fetch relevant context for answering queries.
+    Pass query_emb to reuse an embedding the caller already computed.
     """
+    key = (repo_url, query.strip().lower())
+    with _lock:
+        cached = _qna_cache.get(key)
+        fresh = repo_url in _recently_indexed
+    if cached is not None:
+        print("[QNA] serving cached chunks")
+        return cached
+
     print("[QNA] preparing to retrieve chunks")
 
-    # Ensure local clone exists (index_repo calls this too; keeping it here is harmless)
-    _ = get_repo_path(repo_url)
+    if not fresh:
+        # Ensure local clone exists (index_repo calls this too; keeping it here is harmless)
+        _ = get_repo_path(repo_url)
 
-    # Make sure the repo is indexed (idempotent; will skip existing healthy chunks)
-    ok = index_repo(repo_url)
-    if not ok:
-        print("[ERROR] Failed to index repository")
-        return {"query": query, "context": []}
+        # Make sure the repo is indexed (idempotent; will skip existing healthy chunks)
+        ok = index_repo(repo_url)
+        if not ok:
+            print("[ERROR] Failed to index repository")
+            return {"query": query, "context": []}
+        with _lock:
+            _recently_indexed[repo_url] = True
 
-    chunks = retrieve_docs(repo_url, query)
+    chunks = retrieve_docs(repo_url, query, query_emb=query_emb)
     print("[QNA] retrieved chunks")
 
-    return {
+    result = {
         "query": query,
         "context": chunks
     }
+    if chunks:
+        with _lock:
+            _qna_cache[key] = result
+    return result
+
+def invalidate_repo(repo_url: str):
+    """Forget cached results and index freshness for a repo (e.g. after /reset)."""
+    with _lock:
+        _recently_indexed.pop(repo_url, None)
+        for key in [k for k in _qna_cache if k[0] == repo_url]:
+            _qna_cache.pop(key, None)
 
 def answer_question(query: str, docs):
     if not docs:
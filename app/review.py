@@ -1,20 +1,33 @@
 # app/reviewer.py
 import subprocess
 import os
+import json
 import stat
-import gc
+import codecs
+import hashlib
+import shlex
+import time
+from functools import lru_cache
+from typing import List, Optional, Union
+import asyncio
 from git import Repo
 
+import lint_cache
+
 
 # -------------------------------
 # Helpers
 # -------------------------------
-def run_command(cmd, cwd=None):
-    """Run a shell command and return (code, stdout, stderr)."""
+def run_command(argv: Union[str, List[str]], cwd=None):
+    """Run a command and return (code, stdout, stderr).
+    A string is split shell-style rather than handed to /bin/sh, so neither form spawns a shell."""
+    if isinstance(argv, str):
+        argv = shlex.split(argv)
     proc = subprocess.run(
-        cmd,
-        shell=True,
+        argv,
         cwd=cwd,
+        env=os.environ,
+        close_fds=True,
         capture_output=True,
         text=True
     )
@@ -27,14 +40,27 @@ def remove_readonly(func, path, _):
     func(path)
 
 
-def get_repo_path(repo_url: str, base_dir: str = "../repos") -> str:
+# A refresh within this many seconds of the last fetch is skipped
+FETCH_MIN_INTERVAL = float(os.getenv("REVIEW_FETCH_MIN_INTERVAL", "60"))
+
+
+def _seconds_since_fetch(repo_path: str) -> float:
+    try:
+        return time.time() - os.path.getmtime(os.path.join(repo_path, ".git", "FETCH_HEAD"))
+    except OSError:
+        return float("inf")  # never fetched
+
+
+@lru_cache(maxsize=128)
+def get_repo_path(repo_url: str, base_dir: Optional[str] = None) -> str:
     """
-    Ensure repo is cloned locally. If not, clone it.
-    If already cloned, pull latest changes.
-    Returns the local repo path.
+    Ensure repo is cloned locally (under <project>/repos unless base_dir is given).
+    If not, clone it. Returns the local repo path.
+    Cached per URL for the life of the process; get_repo_path.cache_clear() resets it.
     """
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    base_dir = os.path.join(project_root, "repos")
+    if base_dir is None:
+        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        base_dir = os.path.join(project_root, "repos")
 
     os.makedirs(base_dir, exist_ok=True)
 
@@ -44,131 +70,454 @@ def get_repo_path(repo_url: str, base_dir: str = "../repos") -> str:
     if not os.path.exists(repo_path):
         print(f"[INFO] Cloning {repo_url} into {repo_path}")
         Repo.clone_from(repo_url, repo_path)
-    else:
-        print(f"[INFO] Repo already exists at {repo_path}, pulling latest changes...")
-        try:
-            repo = Repo(repo_path)
-            repo.remotes.origin.pull()
-        except Exception as e:
-            print(f"[WARN] Could not pull latest changes for {repo_url}: {e}")
 
     return repo_path
 
 
-def get_git_diff(repo_path: str, staged: bool = False) -> str:
+def refresh_repo(repo_path: str):
     """
-    Get git diff text for the repo.
-    By default, compares working directory vs HEAD.
+    Fetch and fast-forward an existing clone to its remote
+    (skipped when the last fetch was under FETCH_MIN_INTERVAL seconds ago).
+    """
+    if _seconds_since_fetch(repo_path) <= FETCH_MIN_INTERVAL:
+        return
+    print(f"[INFO] Repo already exists at {repo_path}, fetching latest changes...")
+    try:
+        repo = Repo(repo_path)
+        repo.remotes.origin.fetch()
+        # Fast-forward only: local uncommitted changes are what gets reviewed
+        repo.git.merge("--ff-only", "@{u}")
+    except Exception as e:
+        print(f"[WARN] Could not pull latest changes for {repo_path}: {e}")
+
+
+def _checkout_for_review(repo_url: str, refresh: bool = False) -> str:
+    repo_path = get_repo_path(repo_url)
+    if not os.path.isdir(repo_path):
+        # The clone was removed after its path was cached
+        get_repo_path.cache_clear()
+        repo_path = get_repo_path(repo_url)
+    elif refresh:
+        refresh_repo(repo_path)
+    Repo(repo_path)  # fail early on a path that isn't a git repo
+    return repo_path
+
+
+def _as_repo(repo_or_path) -> Repo:
+    return repo_or_path if isinstance(repo_or_path, Repo) else Repo(repo_or_path)
+
+
+# Let flake8/pylint/autopep8 spread a batch of files over all CPUs (set PARALLEL_LINT=0 to run them single-process)
+PARALLEL_LINT = os.getenv("PARALLEL_LINT", "1") != "0"
+
+# File extensions handed to flake8/pylint/autopep8
+_PY_EXTS = frozenset({".py"})
+
+# Pin the header format changed_files_from_diff parses, whatever the user's git config says
+_DIFF_FLAGS = ["--no-color", "--no-ext-diff", "--src-prefix=a/", "--dst-prefix=b/"]
+
+# Largest piece of `git diff` output held in memory at once
+DIFF_CHUNK_SIZE = 256 * 1024
+
+
+def get_git_diff(repo_or_path, staged: bool = False, chunk_size: int = DIFF_CHUNK_SIZE):
+    """
+    Stream git diff output for the repo (a Repo or a path to one) as bytes chunks
+    of at most chunk_size. By default, compares working directory vs HEAD.
     If staged=True, compares staged changes.
+    The repo is checked on call; a git failure is raised once the output is read.
+    """
+    repo = _as_repo(repo_or_path)
+    return _iter_blocking(_git_diff_async(repo.working_tree_dir, staged=staged, chunk_size=chunk_size))
+
+
+def _header_path(raw: str) -> str:
+    """A path as git writes it in a diff header: C-quoted when it has special characters,
+    and followed by a tab on ---/+++ lines when it contains whitespace."""
+    if raw.endswith("\t"):
+        raw = raw[:-1]
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        # Octal escapes are the UTF-8 bytes of the name
+        raw = codecs.escape_decode(raw[1:-1].encode("utf-8"))[0].decode("utf-8", errors="replace")
+    return raw
+
+
+def changed_files_from_diff(diff_text: str) -> list:
+    """Python files that still exist after the given unified diff (added, modified or renamed),
+    read from the per-file headers so no second git call is needed.
+    Expects the a/ and b/ prefixes that get_git_diff pins with _DIFF_FLAGS.
     """
-    cmd = "git diff --cached" if staged else "git diff HEAD"
-    code, out, err = run_command(cmd, cwd=repo_path)
-    if code != 0:
-        raise Exception(f"Failed to get git diff: {err}")
-    return out.strip()
+    files, in_header = [], False
+    for line in diff_text.split("\n"):
+        if line.startswith("diff --git "):
+            in_header = True
+        elif line.startswith("@@"):
+            in_header = False
+        elif in_header and (line.startswith("+++ ") or line.startswith("rename to ")):
+            if line.startswith("+++ "):
+                path = _header_path(line[4:])
+                if path == "/dev/null":
+                    continue  # deleted
+                path = path[2:]  # drop the "b/" prefix
+            else:
+                path = _header_path(line[len("rename to "):])
+            if _is_python_file(path) and path not in files:
+                files.append(path)
+    return files
+
+
+def _is_python_file(path):
+    return os.path.splitext(path)[1] in _PY_EXTS
+
+
+def _filter_python_files(files):
+    return [f for f in files if _is_python_file(f)]
+
+
+def _group_lines_by_file(output, files):
+    """Split "path:row:col: message" lines into {file: [lines]} for the given files."""
+    by_path = {os.path.normpath(f): f for f in files}
+    grouped = {f: [] for f in files}
+    for line in output.splitlines():
+        path = line.split(":", 1)[0]
+        f = by_path.get(os.path.normpath(path))
+        if f is not None:
+            grouped[f].append(line)
+    return grouped
+
+
+def _cache_lookup(tool, options, repo_dir, py_files):
+    """Split py_files into lint cache hits and the files the tool still has to run on."""
+    keys = lint_cache.file_keys(tool, options, repo_dir, py_files)
+    results = {}
+    for f, key in keys.items():
+        hit = lint_cache.lookup(key) if key else None
+        if hit is not None:
+            results[f] = hit
+    misses = [f for f in py_files if f not in results]
+    return keys, results, misses
+
+
+def _cache_store(keys, results, events, cacheable):
+    for event in events:
+        results[event["file"]] = event
+        if cacheable and keys[event["file"]]:
+            lint_cache.store(keys[event["file"]], event)
+
+
+def _flake8_events(py_files, code, out, err):
+    """Per-file lint events (and whether they can be cached) from one flake8 run."""
+    if code not in (0, 1):
+        # flake8 itself failed; every file gets the error
+        return [{
+            "type": "lint",
+            "file": f,
+            "output": (err or out).strip(),
+            "returncode": code,
+        } for f in py_files], False
+    grouped = _group_lines_by_file(out, py_files)
+    return [{
+        "type": "lint",
+        "file": f,
+        "output": "\n".join(grouped[f]),
+        "returncode": 1 if grouped[f] else 0,
+    } for f in py_files], True
+
+
+def _flake8_argv(py_files):
+    return ["flake8", *(["--jobs=auto"] if PARALLEL_LINT else []), *py_files]
 
 
 def run_flake8_on_files(repo_dir, files):
-    """Run flake8 on only the changed Python files."""
-    for f in files:
-        if f.endswith(".py"):
-            code, out, _ = run_command(f"flake8 {f}", cwd=repo_dir)
-            yield {
-                "type": "lint",
-                "file": f,
-                "output": out.strip(),
-                "returncode": code,
-            }
+    """Run flake8 once over all changed Python files and report per file (unchanged files come from the lint cache)."""
+    return asyncio.run(_flake8_async(repo_dir, files))
+
+
+# pylint exit status bits: 1 fatal, 2 error, 4 warning, 8 refactor, 16 convention, 32 usage error
+PYLINT_STATUS_BITS = {"fatal": 1, "error": 2, "warning": 4, "refactor": 8, "convention": 16}
+PYLINT_USAGE_ERROR = 32
+
+
+def _pylint_argv(py_files):
+    # --jobs=0: one worker per available CPU
+    return ["pylint", *(["--jobs=0"] if PARALLEL_LINT else []), "--disable=R,C", "--output-format=json", *py_files]
+
+
+def _pylint_file_event(f, code, out):
+    return {
+        "type": "bugcheck",
+        "file": f,
+        "output": out.strip(),
+        "returncode": code,
+    }
+
+
+def _pylint_events(py_files, code, out):
+    """Per-file bugcheck events from one JSON pylint run, or None if pylint crashed."""
+    try:
+        messages = json.loads(out) if not code & PYLINT_USAGE_ERROR else None
+    except ValueError:
+        messages = None
+    if not isinstance(messages, list):
+        return None
+
+    by_path = {os.path.normpath(f): f for f in py_files}
+    grouped = {f: [] for f in py_files}
+    for m in messages:
+        f = by_path.get(os.path.normpath(m.get("path", "")))
+        if f is not None:
+            grouped[f].append(m)
+    events = []
+    for f in py_files:
+        # Same line format as pylint's text reporter, which the agent parses
+        lines = [
+            f"{m['path']}:{m['line']}:{m['column']}: {m['message-id']}: {m['message']} ({m['symbol']})"
+            for m in grouped[f]
+        ]
+        status = 0
+        for m in grouped[f]:
+            status |= PYLINT_STATUS_BITS.get(m.get("type"), 0)
+        events.append({
+            "type": "bugcheck",
+            "file": f,
+            "output": "\n".join(lines),
+            "returncode": status,
+        })
+    return events
 
 
 def run_bug_checks(repo_dir, files):
-    """Run pylint (basic bug detection & style)."""
-    for f in files:
-        if f.endswith(".py"):
-            code, out, _ = run_command(f"pylint --disable=R,C {f}", cwd=repo_dir)
+    """Run pylint (basic bug detection & style) once over all changed Python files (unchanged files come from the lint cache)."""
+    return asyncio.run(_bug_checks_async(repo_dir, files))
+
+
+def _file_digest(path):
+    try:
+        with open(path, "rb") as fh:
+            return hashlib.sha256(fh.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _file_digests(paths):
+    return {f: _file_digest(p) for f, p in paths.items()}
+
+
+def _autopep8_argv(py_files):
+    # Aggressive formatting, parallelized across files
+    jobs = [f"--jobs={os.cpu_count() or 1}"] if PARALLEL_LINT else []
+    return ["autopep8", "--in-place", "--aggressive", "--aggressive", *jobs, *py_files]
+
+
+def _autofix_events(py_files, before, after, code, out, err):
+    for f in py_files:
+        if code == 0:
             yield {
-                "type": "bugcheck",
+                "type": "autofix",
                 "file": f,
+                "fixed": True,
+                "changed": after[f] != before[f],
                 "output": out.strip(),
+            }
+        else:
+            yield {
+                "type": "autofix",
+                "file": f,
+                "fixed": False,
+                "output": err.strip(),
                 "returncode": code,
             }
 
 
 def auto_fix_files(repo_dir, files):
-    """Run autopep8 to automatically fix style issues."""
-    for f in files:
-        if f.endswith(".py"):
-            # Run autopep8 with aggressive formatting
-            code, out, err = run_command(f"autopep8 --in-place --aggressive --aggressive {f}", cwd=repo_dir)
-            if code == 0:
-                yield {
-                    "type": "autofix",
-                    "file": f,
-                    "fixed": True,
-                    "output": out.strip(),
-                }
-            else:
-                yield {
-                    "type": "autofix",
-                    "file": f,
-                    "fixed": False,
-                    "output": err.strip(),
-                    "returncode": code,
-                }
+    """Run autopep8 once over all changed Python files to fix style issues in place."""
+    return asyncio.run(_auto_fix_async(repo_dir, files))
+
+
+# -------------------------------
+# Async pipeline (asyncio subprocesses)
+# -------------------------------
+async def run_command_async(argv: List[str], cwd=None):
+    """Async run_command: spawn argv without a shell and return (code, stdout, stderr)."""
+    proc = await asyncio.create_subprocess_exec(
+        *argv, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        out, err = await proc.communicate()
+    finally:
+        await _reap(proc)
+    return proc.returncode, out.decode(errors="replace"), err.decode(errors="replace")
+
+
+async def _reap(proc):
+    """Kill proc if it is still running (e.g. its reader was cancelled) and wait for it to exit."""
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+
+async def _flake8_async(repo_dir, files):
+    py_files = _filter_python_files(files)
+    if not py_files:
+        return []
+    # The cache does blocking disk I/O (and hashes the files); keep it off the event loop
+    keys, results, misses = await asyncio.to_thread(_cache_lookup, "flake8", "", repo_dir, py_files)
+    if misses:
+        code, out, err = await run_command_async(_flake8_argv(misses), cwd=repo_dir)
+        await asyncio.to_thread(_cache_store, keys, results, *_flake8_events(misses, code, out, err))
+    return [results[f] for f in py_files]
+
+
+async def _bug_checks_async(repo_dir, files):
+    py_files = _filter_python_files(files)
+    if not py_files:
+        return []
+    keys, results, misses = await asyncio.to_thread(_cache_lookup, "pylint", "--disable=R,C", repo_dir, py_files)
+    if misses:
+        code, out, _ = await run_command_async(_pylint_argv(misses), cwd=repo_dir)
+        events = _pylint_events(misses, code, out)
+        if events is not None:
+            await asyncio.to_thread(_cache_store, keys, results, events, True)
+        else:
+            # pylint crashed rather than reporting findings; isolate the failure per file
+            limit = asyncio.Semaphore(os.cpu_count() or 1)
+
+            async def check(f):
+                async with limit:
+                    code, out, _ = await run_command_async(["pylint", "--disable=R,C", f], cwd=repo_dir)
+                return _pylint_file_event(f, code, out)
+
+            events = await asyncio.gather(*(check(f) for f in misses))
+            await asyncio.to_thread(_cache_store, keys, results, events, False)
+    return [results[f] for f in py_files]
 
 
-def stream_review(repo_url, staged=False, auto_fix=False):
+async def _auto_fix_async(repo_dir, files):
+    py_files = _filter_python_files(files)
+    if not py_files:
+        return []
+    paths = {f: os.path.join(repo_dir, f) for f in py_files}
+    before = await asyncio.to_thread(_file_digests, paths)
+    code, out, err = await run_command_async(_autopep8_argv(py_files), cwd=repo_dir)
+    after = await asyncio.to_thread(_file_digests, paths) if code == 0 else None
+    return list(_autofix_events(py_files, before, after, code, out, err))
+
+
+async def run_checks_async(repo_dir, files, stage):
+    """Run flake8 and pylint concurrently; yield each tool's per-file events as soon as it finishes."""
+    tasks = [
+        asyncio.ensure_future(_flake8_async(repo_dir, files)),
+        asyncio.ensure_future(_bug_checks_async(repo_dir, files)),
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for event in await next_done:
+                yield {"stage": stage, **event}
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let cancelled checks kill and reap their subprocesses before returning
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _git_diff_async(repo_dir, staged=False, chunk_size=DIFF_CHUNK_SIZE):
+    """Stream `git diff` output as bytes chunks of at most chunk_size."""
+    proc = await asyncio.create_subprocess_exec(
+        "git", "diff", *_DIFF_FLAGS, "--cached" if staged else "HEAD",
+        cwd=repo_dir, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    # Drain stderr alongside stdout so neither pipe can fill up and stall git
+    err_task = asyncio.ensure_future(proc.stderr.read())
+    try:
+        while chunk := await proc.stdout.read(chunk_size):
+            yield chunk
+        err = await err_task
+        await proc.wait()
+    finally:
+        err_task.cancel()
+        await _reap(proc)
+    if proc.returncode:
+        raise Exception(f"Failed to get git diff: {err.decode(errors='replace').strip()}")
+
+
+async def _decode_chunks_async(chunks):
+    """Decode a byte stream to text without splitting multi-byte characters across chunks."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def stream_review_async(repo_url, staged=False, auto_fix=False, refresh=False):
     """
-    Generator that streams review results incrementally:
+    Async generator that streams review results incrementally:
     - Diffs
     - Linting results
     - Bug checks
     - Auto-fixing (if enabled)
     - Post-fix re-checks
+    The tools run as asyncio subprocesses, so events are yielded as each one finishes.
     """
-    repo_dir = get_repo_path(repo_url)
-    diff_text = get_git_diff(repo_dir, staged=staged)
+    repo_dir = await asyncio.to_thread(_checkout_for_review, repo_url, refresh)
 
-    if not diff_text:
+    # --- Original diff, forwarded chunk by chunk ---
+    diff_parts = []
+    async for chunk in _decode_chunks_async(_git_diff_async(repo_dir, staged=staged)):
+        diff_parts.append(chunk)
+        yield {"type": "diff", "diff": chunk}
+
+    if not diff_parts:
         yield {"type": "info", "message": "No changes found to review."}
         return
 
-    # --- Original diff ---
-    yield {"type": "original_diff", "diff": diff_text}
-
     # --- Get changed files ---
-    code, out, _ = run_command("git diff --name-only HEAD", cwd=repo_dir)
-    changed_files = [line.strip() for line in out.splitlines() if line.strip()]
+    changed_files = changed_files_from_diff("".join(diff_parts))
     yield {"type": "changed_files", "files": changed_files}
 
-    # --- Initial lint checks ---
-    for lint in run_flake8_on_files(repo_dir, changed_files):
-        yield {"stage": "before_fix", **lint}
-
-    # --- Initial bug checks ---
-    for bug in run_bug_checks(repo_dir, changed_files):
-        yield {"stage": "before_fix", **bug}
+    # --- Initial lint + bug checks ---
+    async for event in run_checks_async(repo_dir, changed_files, "before_fix"):
+        yield event
 
     # --- Auto-fix if requested ---
     if auto_fix:
         yield {"type": "info", "message": "Applying automatic fixes..."}
-        for fix_result in auto_fix_files(repo_dir, changed_files):
+        for fix_result in await _auto_fix_async(repo_dir, changed_files):
             yield fix_result
-        
+
         # --- Re-check after fixes ---
         yield {"type": "info", "message": "Re-running checks after fixes..."}
-        for lint in run_flake8_on_files(repo_dir, changed_files):
-            yield {"stage": "after_fix", **lint}
-        
-        for bug in run_bug_checks(repo_dir, changed_files):
-            yield {"stage": "after_fix", **bug}
-        
+        async for event in run_checks_async(repo_dir, changed_files, "after_fix"):
+            yield event
+
         # --- Show post-fix diff ---
         try:
-            post_diff = get_git_diff(repo_dir, staged=staged)
+            post_diff = "".join([c async for c in _decode_chunks_async(_git_diff_async(repo_dir, staged=staged))]).strip()
             if post_diff:
                 yield {"type": "post_fix_diff", "diff": post_diff}
         except Exception as e:
             yield {"type": "warning", "message": f"Could not get post-fix diff: {e}"}
 
-    gc.collect()
+
+def _iter_blocking(events):
+    """Iterate an async generator from sync code; items are still yielded as they arrive."""
+    with asyncio.Runner() as runner:
+        try:
+            while True:
+                try:
+                    yield runner.run(events.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            runner.run(events.aclose())
+
+
+def stream_review(repo_url, staged=False, auto_fix=False, refresh=False):
+    """Blocking generator over stream_review_async (for sync callers); events are still yielded as they arrive."""
+    return _iter_blocking(stream_review_async(repo_url, staged=staged, auto_fix=auto_fix, refresh=refresh))
@@ -0,0 +1,183 @@
+# app/semcache.py
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SEMCACHE_THRESHOLD = float(os.getenv("SEMCACHE_THRESHOLD", "0.92"))  # cosine similarity for a hit
+SEMCACHE_MAX_ENTRIES = int(os.getenv("SEMCACHE_MAX_ENTRIES", "10000"))
+TOUCH_FLUSH_EVERY = 64  # hits buffered in memory before their last_used is written
+
+
+def _exact_key(repo_url: str, top_k: int, query: str) -> str:
+    raw = f"{repo_url}|{top_k}|{query.strip()}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
+
+class SemanticCache:
+    """
+    Cache of QnA answers keyed by (repo_url, top_k) and the query embedding.
+    Lookups first try an exact sha256 match on the query text, then a cosine
+    search over all cached query embeddings for the same repo. Entries are
+    evicted LRU once max_entries is reached and persisted to SQLite; recency
+    from hits is kept in memory and written in batches (see flush()).
+    """
+
+    def __init__(self, path: str, dim: int,
+                 threshold: float = SEMCACHE_THRESHOLD,
+                 max_entries: int = SEMCACHE_MAX_ENTRIES):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # Row-major slab of normalized query embeddings (grown by doubling)
+        self._matrix = np.empty((64, dim), dtype=np.float32)
+        self._row_scope = np.empty(64, dtype=np.int32)
+        self._size = 0
+        self._row_keys: List[str] = []  # row -> exact key
+        self._scopes: dict = {}  # "repo_url|top_k" -> scope id
+        # exact key -> {"row", "repo_url", "answer", "top_chunks"}, in LRU order
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._touched: dict = {}  # exact key -> last_used not yet written to SQLite
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semcache ("
+            " key TEXT PRIMARY KEY, repo_url TEXT, top_k INTEGER,"
+            " embedding BLOB, answer TEXT, top_chunks TEXT, last_used REAL)"
+        )
+        self._conn.commit()
+        self._load()
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def get(self, repo_url: str, top_k: int, query: str) -> Optional[Tuple[str, list]]:
+        """Exact-match lookup on the query text (no embedding needed)."""
+        key = _exact_key(repo_url, top_k, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._touch(key)
+            return entry["answer"], entry["top_chunks"]
+
+    def search(self, repo_url: str, top_k: int, query_emb) -> Optional[Tuple[str, list]]:
+        """Semantic lookup: best cached query for the same repo above the threshold."""
+        with self._lock:
+            scope_id = self._scopes.get(f"{repo_url}|{top_k}")
+            if scope_id is None or self._size == 0:
+                return None
+            n = self._size
+            sims = self._matrix[:n] @ _normalize(query_emb)
+            sims[self._row_scope[:n] != scope_id] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            key = self._row_keys[best]
+            self._touch(key)
+            entry = self._entries[key]
+            return entry["answer"], entry["top_chunks"]
+
+    def put(self, repo_url: str, top_k: int, query: str, query_emb, answer: str, top_chunks: list):
+        key = _exact_key(repo_url, top_k, query)
+        emb = _normalize(query_emb)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._append(key, repo_url, top_k, emb, answer, top_chunks)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semcache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, repo_url, top_k, emb.tobytes(), answer, json.dumps(top_chunks), time.time()),
+            )
+            self._write_touches()
+            self._conn.commit()
+
+    def invalidate(self, repo_url: str):
+        """Drop every cached answer for a repo (e.g. after its collection is reset)."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e["repo_url"] == repo_url]:
+                self._remove(key)
+            self._write_touches()
+            self._conn.commit()
+
+    def flush(self):
+        """Write buffered hit recency to SQLite (call on shutdown)."""
+        with self._lock:
+            if self._touched:
+                self._write_touches()
+                self._conn.commit()
+
+    # ------------------------
+    # Internals (caller holds the lock)
+    # ------------------------
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT key, repo_url, top_k, embedding, answer, top_chunks FROM semcache"
+            " ORDER BY last_used DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, repo_url, top_k, blob, answer, top_chunks in reversed(rows):
+            emb = np.frombuffer(blob, dtype=np.float32)
+            if emb.shape[0] != self.dim:
+                continue  # embedding model changed; stale entry
+            self._append(key, repo_url, top_k, emb, answer, json.loads(top_chunks))
+        print(f"[INFO] Semantic cache loaded {self._size} entries")
+
+    def _append(self, key, repo_url, top_k, emb, answer, top_chunks):
+        if self._size == self._matrix.shape[0]:
+            self._matrix = np.concatenate([self._matrix, np.empty_like(self._matrix)])
+            self._row_scope = np.concatenate([self._row_scope, np.empty_like(self._row_scope)])
+        scope = f"{repo_url}|{top_k}"
+        scope_id = self._scopes.setdefault(scope, len(self._scopes))
+        row = self._size
+        self._matrix[row] = emb
+        self._row_scope[row] = scope_id
+        self._row_keys.append(key)
+        self._size += 1
+        self._entries[key] = {"row": row, "repo_url": repo_url, "answer": answer, "top_chunks": top_chunks}
+
+    def _remove(self, key):
+        """Swap-remove the entry's row with the last row to keep the matrix dense."""
+        entry = self._entries.pop(key)
+        row, last = entry["row"], self._size - 1
+        if row != last:
+            moved_key = self._row_keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._row_scope[row] = self._row_scope[last]
+            self._row_keys[row] = moved_key
+            self._entries[moved_key]["row"] = row
+        self._row_keys.pop()
+        self._size -= 1
+        self._touched.pop(key, None)
+        self._conn.execute("DELETE FROM semcache WHERE key = ?", (key,))
+
+    def _touch(self, key):
+        """Mark a hit: the in-memory LRU order is updated now, SQLite once enough hits pile up."""
+        self._entries.move_to_end(key)
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_FLUSH_EVERY:
+            self._write_touches()
+            self._conn.commit()
+
+    def _write_touches(self):
+        self._conn.executemany(
+            "UPDATE semcache SET last_used = ? WHERE key = ?",
+            [(ts, key) for key, ts in self._touched.items()],
+        )
+        self._touched.clear()
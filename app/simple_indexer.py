@@ -1,85 +1,352 @@
 # simple_indexer.py - A simple in-memory alternative to ChromaDB
 import os
+import json
+import logging
 import hashlib
+import blake3
+import queue
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from git import Repo
 from sentence_transformers import SentenceTransformer
-from ingest import find_docs
+from ingest import iter_docs
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "paraphrase-MiniLM-L6-v2"
+# "onnx" runs the int8-quantized ONNX export through ONNX Runtime; anything else uses PyTorch
+EMB_BACKEND = os.getenv("EMB_BACKEND", "onnx")
+ONNX_MODEL_FILE = os.getenv("EMB_ONNX_FILE", "model_qint8_avx512_vnni.onnx")
+
+# On-disk embedding cache: one .npy per sha1(chunk text)
+EMB_CACHE_DIR = Path(os.getenv("EMB_CACHE_DIR", "~/.cache/ai-review/emb")).expanduser()
+EMB_MEMO_SIZE = 4096
+ENCODE_BATCH_SIZE = 64
+PIPELINE_QUEUE_SIZE = 4  # items buffered between the reader, chunker and encoder stages
+# The in-memory matrix is kept in half precision; scoring upcasts it block by block
+# since NumPy has no fast float16 matrix-vector kernel
+MATRIX_DTYPE = np.float16
+SCORE_BLOCK_ROWS = 8192
+# Whole-repo index snapshots (matrix .npy + ids/docs .json) keyed by repo URL and HEAD commit
+INDEX_CACHE_DIR = Path(os.getenv("INDEX_CACHE_DIR", "~/.cache/ai-review/index")).expanduser()
+
+
+def _load_model():
+    """Load the embedding model, preferring the quantized ONNX backend. Returns (model, backend tag)."""
+    if EMB_BACKEND == "onnx":
+        try:
+            model = SentenceTransformer(MODEL_NAME, backend="onnx", model_kwargs={"file_name": ONNX_MODEL_FILE})
+            return model, f"onnx-{os.path.splitext(ONNX_MODEL_FILE)[0]}"
+        except Exception as e:  # onnxruntime/optimum not installed, or an older sentence-transformers
+            print(f"[WARN] ONNX backend unavailable ({e}); using the PyTorch model")
+    return SentenceTransformer(MODEL_NAME), "torch"
+
+
+_DONE = object()  # end-of-stream marker between pipeline stages
+
+
+def _run_stage(target, out_q, errors):
+    """Run a pipeline stage in a daemon thread; always signal the next stage when it stops."""
+    def run():
+        try:
+            target()
+        except Exception as e:  # surfaced by the consumer
+            errors.append(e)
+        finally:
+            out_q.put(_DONE)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _stop_pipeline(threads, stop, queues):
+    """Tell the stages to stop and drain their queues until every stage thread has exited."""
+    stop.set()
+    while any(t.is_alive() for t in threads):
+        for q in queues:
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        for t in threads:
+            t.join(timeout=0.05)
+
+
+def _clean_head_sha(repo_path):
+    """HEAD commit of repo_path, or None if it is not a git repo or has local edits."""
+    try:
+        repo = Repo(repo_path)
+        if repo.is_dirty(untracked_files=False):
+            return None
+        return repo.head.commit.hexsha
+    except Exception:
+        return None
+
+
+class _RepoMatrix:
+    """One repo's embeddings as a contiguous (n, dim) matrix of unit rows; row i belongs to ids[i]."""
+    
+    def __init__(self, dim: int):
+        self.ids = []
+        self.row = {}  # chunk_id -> row
+        self.matrix = np.empty((0, dim), dtype=MATRIX_DTYPE)
+    
+    def add(self, ids, rows):
+        """Append normalized rows, overwriting rows for ids already present."""
+        if not self.ids and len(set(ids)) == len(ids):
+            # Empty so far: adopt the array as is (keeps an index-cache mmap unread)
+            self.ids = list(ids)
+            self.row = {chunk_id: r for r, chunk_id in enumerate(self.ids)}
+            self.matrix = rows
+            return
+        pending = {}  # ids new to the matrix -> position in rows (a repeated id keeps its last row)
+        for i, chunk_id in enumerate(ids):
+            r = self.row.get(chunk_id)
+            if r is not None:
+                self.matrix[r] = rows[i]
+            else:
+                pending[chunk_id] = i
+        for chunk_id in pending:
+            self.row[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+        self.matrix = np.concatenate([self.matrix, rows[list(pending.values())]])
+    
+    def scores(self, q: np.ndarray) -> np.ndarray:
+        out = np.empty(self.matrix.shape[0], dtype=np.float32)
+        for start in range(0, out.size, SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + SCORE_BLOCK_ROWS] = block.astype(np.float32) @ q
+        return out
+
 
 # Simple in-memory storage
 class SimpleIndexer:
     def __init__(self):
-        self.model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
-        self.embeddings = {}
+        self.model, self._backend = _load_model()
+        self._dim = self.model.get_sentence_embedding_dimension()
+        # repo_url -> that repo's embeddings, so a repo-scoped query only touches its own rows
+        self._repos = {}
         self.documents = {}
         self.metadatas = {}
+        # Quantized and full-precision embeddings differ, so each backend gets its own caches
+        self._emb_cache_dir = EMB_CACHE_DIR / self._backend
+        self._emb_cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index_cache_dir = INDEX_CACHE_DIR / self._backend
+        self._index_cache_dir.mkdir(parents=True, exist_ok=True)
+        # Per-instance LRU memo (sha1 -> embedding) in front of the disk cache
+        self._memo = OrderedDict()
+    
+    def _load_cached(self, key: str):
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        path = self._emb_cache_dir / f"{key}.npy"
+        if not path.exists():
+            return None
+        try:
+            emb = np.load(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable embedding cache entry {path.name}: {e}")
+            return None
+        self._remember(key, emb)
+        return emb
+    
+    def _remember(self, key: str, emb: np.ndarray):
+        self._memo[key] = emb
+        if len(self._memo) > EMB_MEMO_SIZE:
+            self._memo.popitem(last=False)
+    
+    def _encode_many(self, texts):
+        """Embed texts, reusing cached embeddings and encoding all misses in one batched call."""
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+        embs = [self._load_cached(k) for k in keys]
+        misses = [i for i, e in enumerate(embs) if e is None]
+        if misses:
+            # SentenceTransformer already places the model on CUDA when it is available
+            fresh = self.model.encode(
+                [texts[i] for i in misses], batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True,
+                show_progress_bar=False, normalize_embeddings=True,
+            )
+            for i, emb in zip(misses, fresh):
+                np.save(self._emb_cache_dir / f"{keys[i]}.npy", emb)
+                self._remember(keys[i], emb)
+                embs[i] = emb
+        logger.debug("Embeddings: %s cached, %s encoded", len(texts) - len(misses), len(misses))
+        return embs
         
+    def _index_cache_paths(self, repo_url: str, head_sha: str):
+        stem = f"{hashlib.sha1(repo_url.encode('utf-8')).hexdigest()[:16]}_{head_sha}"
+        return self._index_cache_dir / f"{stem}.npy", self._index_cache_dir / f"{stem}.json"
+    
+    def _load_index_cache(self, repo_url: str, head_sha: str) -> bool:
+        matrix_path, meta_path = self._index_cache_paths(repo_url, head_sha)
+        if not meta_path.exists():
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            # Copy-on-write mmap: pages are read lazily and never written back
+            matrix = np.load(matrix_path, mmap_mode="c")
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable index cache for {repo_url}: {e}")
+            return False
+        self._add_rows(repo_url, meta["ids"], matrix, normalized=True)
+        for chunk_id, chunk, md in zip(meta["ids"], meta["documents"], meta["metadatas"]):
+            self.documents[chunk_id] = chunk
+            self.metadatas[chunk_id] = md
+        print(f"[INFO] Loaded {len(meta['ids'])} cached chunks for {repo_url} at {head_sha[:12]}")
+        return True
+    
+    def _save_index_cache(self, repo_url: str, head_sha: str):
+        part = self._repos.get(repo_url)
+        if part is None:
+            return
+        ids = part.ids
+        matrix_path, meta_path = self._index_cache_paths(repo_url, head_sha)
+        np.save(matrix_path, np.ascontiguousarray(part.matrix))
+        # The .json is written last, so its presence marks a complete snapshot
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "ids": ids,
+                "documents": [self.documents[i] for i in ids],
+                "metadatas": [self.metadatas[i] for i in ids],
+            }, fh)
+    
     def index_repo(self, repo_url: str, repo_path: str):
         """Index documents from a repository."""
-        docs = find_docs(repo_path)
+        head_sha = _clean_head_sha(repo_path)
+        if head_sha and self._load_index_cache(repo_url, head_sha):
+            return True
+        
+        logger.debug("Indexing repo: %s", repo_url)
         
-        if not docs:
+        # Pipeline: reader thread -> chunker thread -> encoder (this thread), so file I/O,
+        # chunking and model batches overlap and only a few docs are in flight at once
+        doc_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        chunk_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE * ENCODE_BATCH_SIZE)
+        errors = []
+        stop = threading.Event()  # set when the consumer gives up, so the stages don't block on full queues
+        n_docs = 0
+        
+        def read():
+            nonlocal n_docs
+            for doc in iter_docs(repo_path):
+                if stop.is_set():
+                    return
+                n_docs += 1
+                doc_q.put(doc)
+        
+        def chunk():
+            while not stop.is_set():
+                try:
+                    doc = doc_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if doc is _DONE:
+                    return
+                fname, text = doc
+                chunks = self.chunk_text(text)
+                logger.debug("Created %s chunks for %s", len(chunks), fname)
+                for c in chunks:
+                    chunk_q.put((self.make_chunk_id(repo_url, fname, c), c, {"repo": repo_url, "path": fname.lower()}))
+        
+        threads = [_run_stage(read, doc_q, errors), _run_stage(chunk, chunk_q, errors)]
+        
+        # Documents are staged here and only published once the whole repo encoded cleanly
+        all_ids, blocks, batch = [], [], []
+        new_documents, new_metadatas = {}, {}
+        def flush():
+            embs = np.asarray(self._encode_many([c for _, c, _ in batch]), dtype=np.float32)
+            norms = np.linalg.norm(embs, axis=1, keepdims=True)
+            blocks.append((embs / np.where(norms > 0, norms, 1.0)).astype(MATRIX_DTYPE))
+            for chunk_id, c, meta in batch:
+                all_ids.append(chunk_id)
+                new_documents[chunk_id] = c
+                new_metadatas[chunk_id] = meta
+            batch.clear()
+        
+        try:
+            while (item := chunk_q.get()) is not _DONE:
+                batch.append(item)
+                if len(batch) == ENCODE_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        finally:
+            _stop_pipeline(threads, stop, (doc_q, chunk_q))
+        if errors:
+            raise errors[0]
+        self.documents.update(new_documents)
+        self.metadatas.update(new_metadatas)
+        
+        if not n_docs:
             print("[WARN] No documents found to index!")
             return False
-            
-        print(f"[DEBUG] Indexing repo: {repo_url}")
-        print(f"[DEBUG] Found docs: {list(docs.keys())}")
-        
-        added = 0
-        for fname, text in docs.items():
-            print(f"[DEBUG] Processing file: {fname}")
-            chunks = self.chunk_text(text)
-            print(f"[DEBUG] Created {len(chunks)} chunks for {fname}")
-            
-            for chunk in chunks:
-                chunk_id = self.make_chunk_id(repo_url, fname, chunk)
-                print(f"[DEBUG] Processing chunk {chunk_id[:8]}... (length: {len(chunk)})")
-                
-                # Create embedding
-                print(f"[DEBUG] Creating embedding for chunk {chunk_id[:8]}...")
-                emb = self.model.encode(chunk).tolist()
-                print(f"[DEBUG] Embedding created, length: {len(emb)}")
-                
-                # Store in memory
-                self.embeddings[chunk_id] = emb
-                self.documents[chunk_id] = chunk
-                self.metadatas[chunk_id] = {"repo": repo_url, "path": fname.lower()}
-                
-                print(f"[DEBUG] Chunk {chunk_id[:8]} stored successfully")
-                added += 1
-        
-        print(f"[DEBUG] Final index count: {len(self.documents)}")
+        
+        # Store in memory
+        if blocks:
+            self._add_rows(repo_url, all_ids, np.concatenate(blocks), normalized=True)
+        added = len(all_ids)
+        
+        logger.debug("Final index count: %s", len(self.documents))
         print(f"[INFO] Indexed {added} chunks for {repo_url}")
+        if head_sha:
+            self._save_index_cache(repo_url, head_sha)
         return True
     
+    def _add_rows(self, repo_url: str, ids, embs, normalized: bool = False):
+        """Write normalized embeddings into the repo's matrix, overwriting rows for ids already present."""
+        if not ids:
+            return
+        if normalized:
+            rows = np.asarray(embs, dtype=MATRIX_DTYPE)
+        else:
+            rows = np.asarray(embs, dtype=np.float32)
+            norms = np.linalg.norm(rows, axis=1, keepdims=True)
+            rows = (rows / np.where(norms > 0, norms, 1.0)).astype(MATRIX_DTYPE)
+        part = self._repos.get(repo_url)
+        if part is None:
+            part = self._repos[repo_url] = _RepoMatrix(self._dim)
+        part.add(ids, rows)
+    
     def retrieve_docs(self, repo_url: str, query: str, top_k: int = 4):
         """Retrieve relevant documents for a query."""
         if not self.documents:
             print("[WARN] No documents indexed!")
             return []
         
-        print(f"[DEBUG] Index has {len(self.documents)} documents")
+        logger.debug("Index has %s documents", len(self.documents))
+        
+        # Create query embedding (unit length, so a dot product is the cosine similarity)
+        query_emb = self.model.encode(query, normalize_embeddings=True)
+        logger.debug("Query embedding length: %s", len(query_emb))
         
-        # Create query embedding
-        query_emb = self.model.encode(query).tolist()
-        print(f"[DEBUG] Query embedding length: {len(query_emb)}")
+        # Filter by repository if specified: only that repo's matrix is scored
+        if repo_url:
+            parts = [self._repos[repo_url]] if repo_url in self._repos else []
+        else:
+            parts = list(self._repos.values())
         
-        # Calculate similarities
-        similarities = []
-        for chunk_id, emb in self.embeddings.items():
-            # Filter by repository if specified
-            if repo_url and self.metadatas[chunk_id]["repo"] != repo_url:
-                continue
-                
-            similarity = cosine_similarity([query_emb], [emb])[0][0]
-            similarities.append((similarity, chunk_id))
+        q = np.asarray(query_emb, dtype=np.float32)
+        if len(parts) == 1:
+            scores, ids = parts[0].scores(q), parts[0].ids
+        else:
+            scores = np.concatenate([p.scores(q) for p in parts]) if parts else np.empty(0, dtype=np.float32)
+            ids = [chunk_id for p in parts for chunk_id in p.ids]
         
-        # Sort by similarity and get top_k
-        similarities.sort(reverse=True)
-        top_results = similarities[:top_k]
+        # Partition out the top_k (O(N)), then sort only those
+        k = min(top_k, scores.size)
+        if k <= 0:
+            top_rows = []
+        else:
+            idx = np.argpartition(-scores, k - 1)[:k]
+            top_rows = idx[np.argsort(-scores[idx], kind="stable")]
+        top_results = [(scores[row], ids[row]) for row in top_rows]
         
-        print(f"[DEBUG] Found {len(top_results)} relevant chunks")
+        logger.debug("Found %s relevant chunks", len(top_results))
         
         results = []
         for similarity, chunk_id in top_results:
@@ -93,23 +360,27 @@ class SimpleIndexer:
     
     def chunk_text(self, text, max_chars=1000):
         """Split text into chunks."""
-        paragraphs = text.split("\n\n")
-        chunks, cur = [], ""
-        for p in paragraphs:
-            if len(cur) + len(p) > max_chars:
-                if cur.strip():
-                    chunks.append(cur.strip())
-                cur = p
+        # Buffer paragraphs and join once per chunk; cur_len is the length the joined
+        # text would have (each paragraph after a flush counts its "\n\n" separator)
+        chunks, buf, cur_len = [], [], 0
+        for p in text.split("\n\n"):
+            if cur_len + len(p) > max_chars:
+                chunk = "\n\n".join(buf).strip()
+                if chunk:
+                    chunks.append(chunk)
+                buf, cur_len = [p], len(p)
             else:
-                cur += "\n\n" + p
-        if cur.strip():
-            chunks.append(cur.strip())
+                buf.append(p)
+                cur_len += len(p) + 2
+        chunk = "\n\n".join(buf).strip()
+        if chunk:
+            chunks.append(chunk)
         return chunks
     
     def make_chunk_id(self, repo_url: str, file_path: str, chunk_text: str) -> str:
         """Create a unique ID for a chunk."""
         raw = f"{repo_url}|{file_path}|{chunk_text}".encode("utf-8")
-        return hashlib.sha1(raw).hexdigest()
+        return blake3.blake3(raw).hexdigest(length=20)
 
 # Global instance
 indexer = SimpleIndexer()
@@ -1,4 +1,9 @@
 # test_qna.py
+import os
+import logging
+
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "WARNING"))
+
 from indexer import get_repo_path
 from qna import prepare_qna_inputs
 from agent import call_llm
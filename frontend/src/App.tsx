@@ -6,6 +6,7 @@ export default function App() {
   const [query, setQuery] = useState("");
   const [answer, setAnswer] = useState("");
   const [reviewResult, setReviewResult] = useState("");
+  const [reviewProgress, setReviewProgress] = useState("");
   const [autoFix, setAutoFix] = useState(false);
 
   // Loading states
@@ -42,6 +43,7 @@ export default function App() {
   const handleReview = async () => {
     setLoadingReview(true);
     setReviewResult("");
+    setReviewProgress("");
 
     try {
       const res = await fetch("http://localhost:8000/review", {
@@ -49,11 +51,35 @@ export default function App() {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ repo_url: repoUrl, auto_fix: autoFix }),
       });
-
-      const data = await res.json();
-      setReviewResult(
-        data.formatted || "No issues found"
-      );
+      if (!res.body) throw new Error("Empty response");
+
+      // Server-sent events: "data: {type, data}" messages separated by blank lines
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let formatted = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split("\n\n");
+        buffer = messages.pop() || "";
+        for (const message of messages) {
+          if (!message.startsWith("data: ")) continue;
+          const payload = JSON.parse(message.slice("data: ".length));
+          if (payload.type === "event") {
+            setReviewProgress(payload.data.message || `Running ${payload.data.type}...`);
+          } else if (payload.type === "summary") {
+            setReviewProgress("Writing up the review...");
+          } else if (payload.type === "formatted") {
+            formatted = payload.data;
+          } else if (payload.type === "error") {
+            formatted = `❌ ${payload.data}`;
+          }
+        }
+      }
+
+      setReviewResult(formatted || "No issues found");
     } catch (err) {
       setReviewResult("❌ Error running review");
     } finally {
@@ -202,7 +228,7 @@ export default function App() {
                 <div className="flex justify-center items-center space-x-3">
                   <Spinner />
                   <span className="text-indigo-400 font-semibold">
-                    Analyzing code...
+                    {reviewProgress || "Analyzing code..."}
                   </span>
                 </div>
               )}
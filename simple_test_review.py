@@ -24,7 +24,7 @@ def test_basic_functionality():
         
         # Test command execution
         print("🔧 Testing command execution...")
-        code, out, err = run_command("echo 'test'")
+        code, out, err = run_command(["echo", "test"])
         if code == 0 and "test" in out:
             print("✅ Command execution successful")
         else:
@@ -54,7 +54,7 @@ def test_basic_functionality():
                 f.write("def test():\n    x = 1 + 2  # Fixed\n    return x\n")
             
             # Test git diff
-            diff = get_git_diff(test_dir)
+            diff = b"".join(get_git_diff(test_dir)).decode()
             if diff and "test.py" in diff:
                 print("✅ Git diff functionality working")
             else:
@@ -6,52 +6,53 @@ Tests the review functionality including git diff generation, bug detection, lin
 
 import os
 import sys
+import asyncio
+import atexit
 import tempfile
 import shutil
 import subprocess
+import time
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+from pathlib import Path
+from unittest.mock import patch, AsyncMock, MagicMock, mock_open
 import json
+import difflib
+import importlib
+from functools import cached_property
 
-# Add the app directory to the path so we can import our modules
+# Add the app directory to the path so review can be imported (lazily, see _import_review)
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
-from review import (
-    run_command, 
-    get_repo_path, 
-    get_git_diff, 
-    run_flake8_on_files, 
-    run_bug_checks, 
-    auto_fix_files, 
-    stream_review
-)
 
+class _FakeProcess:
+    """Stand-in for an asyncio subprocess that has exited cleanly."""
+    returncode = 0
 
-class TestReviewAgent(unittest.TestCase):
-    """Test cases for the AI Code Review Agent"""
-    
-    def setUp(self):
-        """Set up test environment"""
-        self.test_dir = tempfile.mkdtemp()
-        self.repo_dir = os.path.join(self.test_dir, "test-repo")
-        os.makedirs(self.repo_dir)
-        
-        # Create a mock git repository
-        self._setup_mock_git_repo()
-        
-    def tearDown(self):
-        """Clean up test environment"""
-        shutil.rmtree(self.test_dir, ignore_errors=True)
-    
-    def _setup_mock_git_repo(self):
-        """Set up a mock git repository for testing"""
-        # Initialize git repo
-        subprocess.run(["git", "init"], cwd=self.repo_dir, check=True)
-        
-        # Create a test Python file with some issues
-        test_file_path = os.path.join(self.repo_dir, "test_file.py")
-        with open(test_file_path, "w") as f:
-            f.write("""def test_function():
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    async def communicate(self):
+        return self.stdout, b""
+
+    async def wait(self):
+        return self.returncode
+
+
+async def _fake_tool_exec(*argv, **kwargs):
+    """Stand-in for asyncio.create_subprocess_exec: every tool exits cleanly with no findings."""
+    return _FakeProcess(b"[]" if argv[0] == "pylint" else b"")  # pylint runs with --output-format=json
+
+_TEMPLATE_DIR = None
+_LINT_CACHE_DIR = None
+_USER_LINT_CACHE_DIR = None
+# git's progress/banner output isn't asserted anywhere; don't pipe it
+_QUIET = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+# Identity passed per commit instead of separate `git config` calls
+GIT_IDENTITY = ["-c", "user.name=Test User", "-c", "user.email=test@example.com"]
+
+
+# File contents for the template repos, encoded once
+_MOCK_FILE_BYTES = """def test_function():
     x=1+2
     if x==3:
         print('hello world')
@@ -60,17 +61,9 @@ class TestReviewAgent(unittest.TestCase):
 class TestClass:
     def __init__(self):
         self.value=None
-""")
-        
-        # Add and commit the file
-        subprocess.run(["git", "add", "test_file.py"], cwd=self.repo_dir, check=True)
-        subprocess.run(["git", "config", "user.name", "Test User"], cwd=self.repo_dir, check=True)
-        subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=self.repo_dir, check=True)
-        subprocess.run(["git", "commit", "-m", "Initial commit"], cwd=self.repo_dir, check=True)
-        
-        # Make some changes to create a diff
-        with open(test_file_path, "w") as f:
-            f.write("""def test_function():
+""".encode("utf-8")
+
+_MOCK_UPDATED_BYTES = """def test_function():
     x=1+2  # This line has spacing issues
     if x==3:
         print('hello world')  # Missing space after comma
@@ -80,255 +73,463 @@ class TestClass:
     def __init__(self):
         self.value=None  # Missing space around operator
         self.another_value = "test"
-""")
-    
+""".encode("utf-8")
+
+_FILES_CONTENT_BYTES = {k: v.encode("utf-8") for k, v in {
+    "main.py": """import os
+import sys
+
+def main():
+    x=1+2
+    if x==3:
+        print('hello world')
+    return x
+
+if __name__=='__main__':
+    main()
+""",
+    "utils.py": """def helper_function():
+    value=None
+    return value
+
+class HelperClass:
+    def __init__(self):
+        self.data=[]
+""",
+    "config.py": """# Configuration file
+DEBUG=True
+API_KEY="test_key"
+DATABASE_URL="sqlite:///test.db"
+"""
+}.items()}
+
+_UPDATED_CONTENT = {
+    "main.py": """import os
+import sys
+
+def main():
+    x = 1 + 2  # Fixed spacing
+    if x == 3:  # Fixed spacing
+        print('hello world')  # Fixed spacing
+    return x
+
+if __name__ == '__main__':  # Fixed spacing
+    main()
+""",
+    "utils.py": """def helper_function():
+    value = None  # Fixed spacing
+    return value
+
+class HelperClass:
+    def __init__(self):
+        self.data = []  # Fixed spacing
+""",
+    "config.py": """# Configuration file
+DEBUG = True  # Fixed spacing
+API_KEY = "test_key"  # Fixed spacing
+DATABASE_URL = "sqlite:///test.db"  # Fixed spacing
+"""
+}
+
+# The integration repo's working-tree changes as one patch, applied with a single `git apply`
+_INTEGRATION_PATCH = "".join(
+    line
+    for name, new in _UPDATED_CONTENT.items()
+    for line in difflib.unified_diff(
+        _FILES_CONTENT_BYTES[name].decode("utf-8").splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        f"a/{name}", f"b/{name}",
+    )
+).encode("utf-8")
+
+
+def _build_mock_git_repo(repo_dir):
+    """Build the git repository copied into each TestReviewAgent test"""
+    # Initialize git repo
+    subprocess.run(["git", "init"], cwd=repo_dir, check=True, **_QUIET)
+
+    # Create a test Python file with some issues
+    test_file_path = Path(repo_dir, "test_file.py")
+    test_file_path.write_bytes(_MOCK_FILE_BYTES)
+
+    # Add and commit the file
+    subprocess.run(["git", "add", "test_file.py"], cwd=repo_dir, check=True, **_QUIET)
+    subprocess.run(["git", *GIT_IDENTITY, "commit", "-m", "Initial commit"], cwd=repo_dir, check=True, **_QUIET)
+
+    # Make some changes to create a diff
+    test_file_path.write_bytes(_MOCK_UPDATED_BYTES)
+
+
+def _build_integration_repo(repo_dir):
+    """Build the multi-file git repository copied into each integration test"""
+    # Initialize git repo
+    subprocess.run(["git", "init"], cwd=repo_dir, check=True, **_QUIET)
+
+    # Create and commit multiple Python files with various issues
+    for filename, data in _FILES_CONTENT_BYTES.items():
+        Path(repo_dir, filename).write_bytes(data)
+    subprocess.run(["git", "add", "."], cwd=repo_dir, check=True, **_QUIET)
+    subprocess.run(["git", *GIT_IDENTITY, "commit", "-m", "Initial commit with multiple files"], cwd=repo_dir, check=True, **_QUIET)
+
+    # Make changes to create diffs
+    subprocess.run(["git", "apply", "-"], cwd=repo_dir, input=_INTEGRATION_PATCH, check=True, **_QUIET)
+
+
+def _use_lint_cache_dir(lint_cache, path):
+    """Point the lint cache at path, closing the cache opened for the previous one."""
+    if lint_cache._cache.cache_info().currsize:
+        lint_cache._cache().close()
+        lint_cache._cache.cache_clear()
+    lint_cache.LINT_CACHE_DIR = path
+
+
+def setUpModule():
+    """Build the template repositories once; each test works on its own copy"""
+    global _TEMPLATE_DIR, _LINT_CACHE_DIR, _USER_LINT_CACHE_DIR
+    # Keep lint results cached by the tests out of the user's cache
+    lint_cache = importlib.import_module("lint_cache")
+    _USER_LINT_CACHE_DIR = lint_cache.LINT_CACHE_DIR
+    _LINT_CACHE_DIR = tempfile.mkdtemp(prefix="lint-cache-")
+    _use_lint_cache_dir(lint_cache, _LINT_CACHE_DIR)
+
+    _TEMPLATE_DIR = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, _TEMPLATE_DIR, ignore_errors=True)
+    for name, build in (("test-repo", _build_mock_git_repo), ("integration-repo", _build_integration_repo)):
+        repo_dir = os.path.join(_TEMPLATE_DIR, name)
+        os.makedirs(repo_dir)
+        build(repo_dir)
+
+
+def tearDownModule():
+    """Restore the user's lint cache and remove the one the tests used"""
+    _use_lint_cache_dir(importlib.import_module("lint_cache"), _USER_LINT_CACHE_DIR)
+    shutil.rmtree(_LINT_CACHE_DIR, ignore_errors=True)
+
+
+def _import_review():
+    """Import app/review.py on first use, so collecting tests doesn't load it and its dependencies"""
+    return importlib.import_module("review")
+
+
+class ReviewModuleMixin:
+    @cached_property
+    def review(self):
+        return _import_review()
+
+
+class TestReviewAgent(ReviewModuleMixin, unittest.TestCase):
+    """Test cases for the AI Code Review Agent"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Run the read-only stream_review variants once and share their events"""
+        shared_dir = cls.enterClassContext(tempfile.TemporaryDirectory(ignore_cleanup_errors=True))
+        repo_dir = os.path.join(shared_dir, "test-repo")
+        shutil.copytree(os.path.join(_TEMPLATE_DIR, "test-repo"), repo_dir)
+        with patch('review.get_repo_path', return_value=repo_dir):
+            cls._results_default = list(_import_review().stream_review("https://github.com/test/repo"))
+            # Auto-fix rewrites the files, so it runs second
+            cls._results_autofix = list(_import_review().stream_review("https://github.com/test/repo", auto_fix=True))
+
+    def setUp(self):
+        """Set up test environment"""
+        # Removed after the test even if setUp or the test fails
+        self.test_dir = self.enterContext(tempfile.TemporaryDirectory(ignore_cleanup_errors=True))
+        self.repo_dir = os.path.join(self.test_dir, "test-repo")
+        shutil.copytree(os.path.join(_TEMPLATE_DIR, "test-repo"), self.repo_dir)
+        
     def test_run_command_success(self):
         """Test successful command execution"""
-        code, out, err = run_command("echo 'hello world'")
+        code, out, err = self.review.run_command(["echo", "hello world"])
         self.assertEqual(code, 0)
         self.assertIn("hello world", out)
         self.assertEqual(err, "")
-    
+
     def test_run_command_failure(self):
         """Test failed command execution"""
-        code, out, err = run_command("exit 1")
+        code, out, err = self.review.run_command(["false"])
         self.assertEqual(code, 1)
-    
+
+    def test_run_command_string_skips_shell(self):
+        """Test that a command string is split and run without a shell"""
+        with patch("review.subprocess.run", wraps=subprocess.run) as spy:
+            code, out, _ = self.review.run_command("echo 'hello world'")
+        self.assertEqual(code, 0)
+        self.assertEqual(out.strip(), "hello world")
+        self.assertEqual(spy.call_args.args[0], ["echo", "hello world"])
+        self.assertFalse(spy.call_args.kwargs.get("shell", False))
+
     def test_get_git_diff(self):
         """Test git diff generation"""
-        diff = get_git_diff(self.repo_dir)
+        diff = b"".join(self.review.get_git_diff(self.repo_dir)).decode()
         self.assertIsInstance(diff, str)
         self.assertIn("test_file.py", diff)
         self.assertIn("+", diff)  # Should contain additions
         self.assertIn("-", diff)  # Should contain deletions
-    
+
     def test_get_git_diff_staged(self):
         """Test staged git diff"""
         # Stage the changes
-        subprocess.run(["git", "add", "test_file.py"], cwd=self.repo_dir, check=True)
+        subprocess.run(["git", "add", "test_file.py"], cwd=self.repo_dir, check=True, **_QUIET)
         
-        diff = get_git_diff(self.repo_dir, staged=True)
+        diff = b"".join(self.review.get_git_diff(self.repo_dir, staged=True)).decode()
         self.assertIsInstance(diff, str)
         self.assertIn("test_file.py", diff)
-    
+
     def test_get_git_diff_no_changes(self):
         """Test git diff when no changes exist"""
         # Reset all changes
-        subprocess.run(["git", "reset", "--hard", "HEAD"], cwd=self.repo_dir, check=True)
+        subprocess.run(["git", "reset", "--hard", "HEAD"], cwd=self.repo_dir, check=True, **_QUIET)
         
-        diff = get_git_diff(self.repo_dir)
+        diff = b"".join(self.review.get_git_diff(self.repo_dir)).decode()
         self.assertEqual(diff, "")
-    
-    def test_run_flake8_on_files(self):
+
+    def test_get_git_diff_chunks(self):
+        """Test that the diff is streamed in chunks no larger than chunk_size"""
+        with open(os.path.join(self.repo_dir, "test_file.py"), "a") as f:
+            f.write("".join(f"value_{i} = {i}\n" for i in range(2000)))
+        
+        chunks = list(self.review.get_git_diff(self.repo_dir, chunk_size=4096))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(c) <= 4096 for c in chunks))
+        self.assertIn("+value_1999 = 1999", b"".join(chunks).decode())
+
+    def test_changed_files_from_diff_special_paths(self):
+        """Test that paths with spaces or non-ASCII characters are read from the diff headers"""
+        names = ["sp ace.py", "café.py"]
+        for name in names:
+            Path(self.repo_dir, name).write_text("x = 1\n")
+        subprocess.run(["git", "add", *names], cwd=self.repo_dir, check=True, **_QUIET)
+        subprocess.run(["git", *GIT_IDENTITY, "commit", "-m", "Add files"], cwd=self.repo_dir, check=True, **_QUIET)
+        for name in names:
+            Path(self.repo_dir, name).write_text("x = 2\n")
+        # The header format must not depend on the user's git config
+        subprocess.run(["git", "config", "diff.noprefix", "true"], cwd=self.repo_dir, check=True, **_QUIET)
+        
+        diff = b"".join(self.review.get_git_diff(self.repo_dir)).decode()
+        self.assertEqual(
+            sorted(self.review.changed_files_from_diff(diff)),
+            sorted(["test_file.py", *names]),
+        )
+
+    @patch("review.lint_cache.lookup", new=lambda key: None)
+    @patch("review.lint_cache.store", new=lambda key, result: None)
+    @patch("review.asyncio.create_subprocess_exec", side_effect=_fake_tool_exec)
+    def test_run_flake8_on_files(self, mock_exec):
         """Test flake8 linting on Python files"""
         files = ["test_file.py"]
-        results = list(run_flake8_on_files(self.repo_dir, files))
+        results = list(self.review.run_flake8_on_files(self.repo_dir, files))
         
+        mock_exec.assert_called_once()
+        argv = list(mock_exec.call_args.args)
+        self.assertEqual(argv[0], "flake8")
+        self.assertEqual(argv[-1], "test_file.py")
+        self.assertEqual(mock_exec.call_args.kwargs["cwd"], self.repo_dir)
         self.assertEqual(len(results), 1)
-        result = results[0]
+        # Results may arrive in any order; match on the file
+        result = {r["file"]: r for r in results}["test_file.py"]
         self.assertEqual(result["type"], "lint")
         self.assertEqual(result["file"], "test_file.py")
-        self.assertIsInstance(result["returncode"], int)
-    
-    def test_run_bug_checks(self):
+        self.assertEqual(result["returncode"], 0)
+
+    @patch("review.lint_cache.lookup", new=lambda key: None)
+    @patch("review.lint_cache.store", new=lambda key, result: None)
+    @patch("review.asyncio.create_subprocess_exec", side_effect=_fake_tool_exec)
+    def test_run_bug_checks(self, mock_exec):
         """Test bug checking with pylint"""
         files = ["test_file.py"]
-        results = list(run_bug_checks(self.repo_dir, files))
+        results = list(self.review.run_bug_checks(self.repo_dir, files))
         
+        mock_exec.assert_called_once()
+        argv = list(mock_exec.call_args.args)
+        self.assertEqual(argv[0], "pylint")
+        self.assertIn("--output-format=json", argv)
+        self.assertEqual(argv[-1], "test_file.py")
         self.assertEqual(len(results), 1)
-        result = results[0]
+        # Results may arrive in any order; match on the file
+        result = {r["file"]: r for r in results}["test_file.py"]
         self.assertEqual(result["type"], "bugcheck")
         self.assertEqual(result["file"], "test_file.py")
-        self.assertIsInstance(result["returncode"], int)
-    
-    def test_auto_fix_files(self):
+        self.assertEqual(result["returncode"], 0)
+
+    @patch("review.asyncio.create_subprocess_exec", side_effect=_fake_tool_exec)
+    def test_auto_fix_files(self, mock_exec):
         """Test automatic file fixing"""
         files = ["test_file.py"]
-        results = list(auto_fix_files(self.repo_dir, files))
+        results = list(self.review.auto_fix_files(self.repo_dir, files))
         
+        mock_exec.assert_called_once()
+        argv = list(mock_exec.call_args.args)
+        self.assertEqual(argv[:2], ["autopep8", "--in-place"])
+        self.assertEqual(argv[-1], "test_file.py")
         self.assertEqual(len(results), 1)
-        result = results[0]
+        # Results may arrive in any order; match on the file
+        result = {r["file"]: r for r in results}["test_file.py"]
         self.assertEqual(result["type"], "autofix")
         self.assertEqual(result["file"], "test_file.py")
         self.assertIsInstance(result["fixed"], bool)
-    
+
     def test_stream_review_basic(self):
         """Test basic streaming review functionality"""
-        # Mock the get_repo_path function to return our test repo
+        results = self._results_default
+        
+        # Should have at least diff chunks and changed files
+        self.assertGreater(len(results), 0)
+        
+        # Check for expected result types
+        result_types = [r["type"] for r in results]
+        self.assertIn("changed_files", result_types)
+        self.assertIn("diff", result_types)
+        
+        # flake8 and pylint run concurrently, so their events may come in either order
+        checks = sorted((r["type"], r["file"]) for r in results if r["type"] in ("lint", "bugcheck"))
+        self.assertEqual(checks, [("bugcheck", "test_file.py"), ("lint", "test_file.py")])
+
+    def test_stream_review_async(self):
+        """Test that the async generator yields the same events as the blocking one"""
+        async def collect():
+            return [r async for r in self.review.stream_review_async("https://github.com/test/repo")]
+        
         with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo"))
-            
-            # Should have at least diff chunks and changed files
-            self.assertGreater(len(results), 0)
-            
-            # Check for expected result types
-            result_types = [r["type"] for r in results]
-            self.assertIn("changed_files", result_types)
-            self.assertIn("diff", result_types)
-    
+            results = asyncio.run(collect())
+        
+        def key(r):
+            return json.dumps(r, sort_keys=True)
+        self.assertEqual(sorted(map(key, results)), sorted(map(key, self._results_default)))
+
     def test_stream_review_with_autofix(self):
         """Test streaming review with auto-fix enabled"""
-        with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo", auto_fix=True))
-            
-            # Should have autofix results
-            result_types = [r["type"] for r in results]
-            self.assertIn("autofix", result_types)
-    
+        # Should have autofix results
+        result_types = [r["type"] for r in self._results_autofix]
+        self.assertIn("autofix", result_types)
+
     def test_stream_review_no_changes(self):
         """Test streaming review when no changes exist"""
         # Reset all changes
-        subprocess.run(["git", "reset", "--hard", "HEAD"], cwd=self.repo_dir, check=True)
+        subprocess.run(["git", "reset", "--hard", "HEAD"], cwd=self.repo_dir, check=True, **_QUIET)
         
         with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo"))
+            results = list(self.review.stream_review("https://github.com/test/repo"))
             
             # Should have info message about no changes
             self.assertEqual(len(results), 1)
             self.assertEqual(results[0]["type"], "info")
             self.assertIn("No changes found", results[0]["message"])
-    
+
     def test_stream_review_staged_changes(self):
         """Test streaming review with staged changes"""
         # Stage the changes
-        subprocess.run(["git", "add", "test_file.py"], cwd=self.repo_dir, check=True)
+        subprocess.run(["git", "add", "test_file.py"], cwd=self.repo_dir, check=True, **_QUIET)
         
         with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo", staged=True))
+            results = list(self.review.stream_review("https://github.com/test/repo", staged=True))
             
             # Should have results
             self.assertGreater(len(results), 0)
-    
+
+    def test_get_repo_path_cache(self):
+        """Test that repeated lookups of the same URL clone once and then hit the cache"""
+        get_repo_path = self.review.get_repo_path
+        get_repo_path.cache_clear()
+        self.addCleanup(get_repo_path.cache_clear)
+        base_dir = os.path.join(self.test_dir, "repos")
+        
+        with patch("review.Repo.clone_from", side_effect=lambda url, path: os.makedirs(path)) as mock_clone:
+            first = get_repo_path("https://github.com/test/repo", base_dir=base_dir)
+            second = get_repo_path("https://github.com/test/repo", base_dir=base_dir)
+        
+        self.assertEqual(first, os.path.join(base_dir, "repo"))
+        self.assertEqual(second, first)
+        mock_clone.assert_called_once_with("https://github.com/test/repo", first)
+
     def test_error_handling_invalid_repo(self):
         """Test error handling for invalid repository"""
         with self.assertRaises(Exception):
-            get_git_diff("/invalid/path")
-    
-    def test_file_filtering(self):
-        """Test that only Python files are processed for linting and bug checking"""
-        # Create a non-Python file
-        non_py_file = os.path.join(self.repo_dir, "test.txt")
-        with open(non_py_file, "w") as f:
-            f.write("This is not a Python file")
-        
+            self.review.get_git_diff("/invalid/path")
+
+    def test_filter_python_files(self):
+        """Test that only Python files are kept for linting, bug checking and fixing"""
+        files = ["test_file.py", "test.txt", "pkg/mod.py", "setup.cfg"]
+        self.assertEqual(self.review._filter_python_files(files), ["test_file.py", "pkg/mod.py"])
+        self.assertEqual(self.review._filter_python_files(["README.md"]), [])
+
+    def test_tools_only_run_on_python_files(self):
+        """Test that each tool is handed only the Python files"""
         files = ["test_file.py", "test.txt"]
+        for run_tool in (self.review._flake8_async, self.review._bug_checks_async, self.review._auto_fix_async):
+            with self.subTest(tool=run_tool.__name__):
+                with patch("review.lint_cache.lookup", return_value=None), \
+                        patch("review.lint_cache.store"), \
+                        patch("review.asyncio.create_subprocess_exec", side_effect=_fake_tool_exec) as mock_exec:
+                    results = asyncio.run(run_tool(self.repo_dir, files))
+                self.assertEqual([r["file"] for r in results], ["test_file.py"])
+                argv = mock_exec.call_args.args
+                self.assertIn("test_file.py", argv)
+                self.assertNotIn("test.txt", argv)
+
+    def test_parallel_lint_flag(self):
+        """Test that PARALLEL_LINT toggles each tool's --jobs option"""
+        files = ["test_file.py"]
+        for parallel in (True, False):
+            for run_tool in (self.review._flake8_async, self.review._bug_checks_async, self.review._auto_fix_async):
+                with self.subTest(tool=run_tool.__name__, parallel=parallel):
+                    with patch("review.PARALLEL_LINT", parallel), \
+                            patch("review.lint_cache.lookup", return_value=None), \
+                            patch("review.lint_cache.store"), \
+                            patch("review.asyncio.create_subprocess_exec", side_effect=_fake_tool_exec) as mock_exec:
+                        asyncio.run(run_tool(self.repo_dir, files))
+                    argv = mock_exec.call_args.args
+                    self.assertEqual(any(a.startswith("--jobs=") for a in argv), parallel)
+
+    def test_linters_run_once_for_multiple_files(self):
+        """Test that flake8 and pylint are each invoked once for several files"""
+        with open(os.path.join(self.repo_dir, "other_file.py"), "w") as f:
+            f.write("import os\n")
+        files = ["test_file.py", "other_file.py"]
         
-        # Test flake8 filtering
-        flake8_results = list(run_flake8_on_files(self.repo_dir, files))
-        self.assertEqual(len(flake8_results), 1)  # Only Python file should be processed
-        self.assertEqual(flake8_results[0]["file"], "test_file.py")
-        
-        # Test bug check filtering
-        bug_results = list(run_bug_checks(self.repo_dir, files))
-        self.assertEqual(len(bug_results), 1)  # Only Python file should be processed
-        self.assertEqual(bug_results[0]["file"], "test_file.py")
+        for run_tool in (self.review._flake8_async, self.review._bug_checks_async):
+            with self.subTest(tool=run_tool.__name__):
+                with patch("review.lint_cache.lookup", return_value=None), \
+                        patch("review.asyncio.create_subprocess_exec", wraps=asyncio.create_subprocess_exec) as spy:
+                    results = asyncio.run(run_tool(self.repo_dir, files))
+                self.assertEqual(spy.call_count, 1)
+                self.assertEqual(sorted(r["file"] for r in results), sorted(files))
+                by_file = {r["file"]: r for r in results}
+                self.assertIn("other_file.py", by_file["other_file.py"]["output"])
+                self.assertNotIn("other_file.py", by_file["test_file.py"]["output"])
+
+    def test_lint_results_cached_for_unchanged_files(self):
+        """Test that unchanged files are served from the lint cache without rerunning the tools"""
+        files = ["test_file.py"]
+        for run_tool in (self.review._flake8_async, self.review._bug_checks_async):
+            with self.subTest(tool=run_tool.__name__):
+                first = asyncio.run(run_tool(self.repo_dir, files))
+                with patch("review.asyncio.create_subprocess_exec") as mock_exec:
+                    second = asyncio.run(run_tool(self.repo_dir, files))
+                mock_exec.assert_not_called()
+                self.assertEqual(second, first)
         
-        # Test autofix filtering
-        autofix_results = list(auto_fix_files(self.repo_dir, files))
-        self.assertEqual(len(autofix_results), 1)  # Only Python file should be processed
-        self.assertEqual(autofix_results[0]["file"], "test_file.py")
+        # Editing the file invalidates its entry
+        with open(os.path.join(self.repo_dir, "test_file.py"), "a") as f:
+            f.write("x = 1\n")
+        with patch("review.asyncio.create_subprocess_exec", wraps=asyncio.create_subprocess_exec) as spy:
+            asyncio.run(self.review._flake8_async(self.repo_dir, files))
+        self.assertEqual(spy.call_count, 1)
 
 
-class TestReviewAgentIntegration(unittest.TestCase):
+class TestReviewAgentIntegration(ReviewModuleMixin, unittest.TestCase):
     """Integration tests for the review agent"""
-    
+
     def setUp(self):
         """Set up integration test environment"""
-        self.test_dir = tempfile.mkdtemp()
+        self.test_dir = self.enterContext(tempfile.TemporaryDirectory(ignore_cleanup_errors=True))
         self.repo_dir = os.path.join(self.test_dir, "integration-repo")
-        os.makedirs(self.repo_dir)
-        
-        # Create a more complex test repository
-        self._setup_integration_repo()
-    
-    def tearDown(self):
-        """Clean up integration test environment"""
-        shutil.rmtree(self.test_dir, ignore_errors=True)
-    
-    def _setup_integration_repo(self):
-        """Set up a complex test repository for integration testing"""
-        # Initialize git repo
-        subprocess.run(["git", "init"], cwd=self.repo_dir, check=True)
-        subprocess.run(["git", "config", "user.name", "Test User"], cwd=self.repo_dir, check=True)
-        subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=self.repo_dir, check=True)
-        
-        # Create multiple Python files with various issues
-        files_content = {
-            "main.py": """import os
-import sys
-
-def main():
-    x=1+2
-    if x==3:
-        print('hello world')
-    return x
-
-if __name__=='__main__':
-    main()
-""",
-            "utils.py": """def helper_function():
-    value=None
-    return value
+        shutil.copytree(os.path.join(_TEMPLATE_DIR, "integration-repo"), self.repo_dir)
 
-class HelperClass:
-    def __init__(self):
-        self.data=[]
-""",
-            "config.py": """# Configuration file
-DEBUG=True
-API_KEY="test_key"
-DATABASE_URL="sqlite:///test.db"
-"""
-        }
-        
-        # Create and commit files
-        for filename, content in files_content.items():
-            filepath = os.path.join(self.repo_dir, filename)
-            with open(filepath, "w") as f:
-                f.write(content)
-            subprocess.run(["git", "add", filename], cwd=self.repo_dir, check=True)
-        
-        subprocess.run(["git", "commit", "-m", "Initial commit with multiple files"], cwd=self.repo_dir, check=True)
-        
-        # Make changes to create diffs
-        updated_content = {
-            "main.py": """import os
-import sys
-
-def main():
-    x = 1 + 2  # Fixed spacing
-    if x == 3:  # Fixed spacing
-        print('hello world')  # Fixed spacing
-    return x
-
-if __name__ == '__main__':  # Fixed spacing
-    main()
-""",
-            "utils.py": """def helper_function():
-    value = None  # Fixed spacing
-    return value
-
-class HelperClass:
-    def __init__(self):
-        self.data = []  # Fixed spacing
-""",
-            "config.py": """# Configuration file
-DEBUG = True  # Fixed spacing
-API_KEY = "test_key"  # Fixed spacing
-DATABASE_URL = "sqlite:///test.db"  # Fixed spacing
-"""
-        }
-        
-        # Update files
-        for filename, content in updated_content.items():
-            filepath = os.path.join(self.repo_dir, filename)
-            with open(filepath, "w") as f:
-                f.write(content)
-    
     def test_full_review_workflow(self):
         """Test the complete review workflow"""
         with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo", auto_fix=True))
+            results = list(self.review.stream_review("https://github.com/test/repo", auto_fix=True))
             
             # Verify we have all expected result types
             result_types = [r["type"] for r in results]
@@ -343,14 +544,14 @@ DATABASE_URL = "sqlite:///test.db"  # Fixed spacing
             self.assertIn("main.py", changed_files_result["files"])
             self.assertIn("utils.py", changed_files_result["files"])
             self.assertIn("config.py", changed_files_result["files"])
-    
+
     def test_review_with_staged_changes(self):
         """Test review with staged changes"""
         # Stage all changes
-        subprocess.run(["git", "add", "."], cwd=self.repo_dir, check=True)
+        subprocess.run(["git", "add", "."], cwd=self.repo_dir, check=True, **_QUIET)
         
         with patch('review.get_repo_path', return_value=self.repo_dir):
-            results = list(stream_review("https://github.com/test/repo", staged=True, auto_fix=True))
+            results = list(self.review.stream_review("https://github.com/test/repo", staged=True, auto_fix=True))
             
             # Should have results
             self.assertGreater(len(results), 0)
@@ -360,20 +561,88 @@ DATABASE_URL = "sqlite:///test.db"  # Fixed spacing
             self.assertGreater(len(diff_results), 0)
 
 
+class TestReviewSummary(unittest.TestCase):
+    """Tests for turning review events into the LLM summary"""
+
+    @cached_property
+    def agent(self):
+        return importlib.import_module("agent")
+
+    def test_non_python_change_still_summarized(self):
+        """Test that a diff the linters can't see (no lint events) still goes to the LLM"""
+        events = [
+            {"type": "diff", "diff": "diff --git a/README.md b/README.md\n+New setup notes\n"},
+            {"type": "changed_files", "files": []},
+        ]
+        reply = MagicMock(content='{"summary": "Docs update.", "issues": [], "green_signal": true, "confidence": "high"}')
+        llm = MagicMock(ainvoke=AsyncMock(return_value=reply))
+        
+        with patch("agent.get_llm", return_value=llm):
+            summary, _ = asyncio.run(self.agent._summarize_review_async(events))
+        
+        # Only the summary call: there are no lint issues to suggest fixes for
+        llm.ainvoke.assert_awaited_once()
+        self.assertEqual(summary["summary"], "Docs update.")
+
+    def test_no_diff_skips_llm(self):
+        """Test that a review with nothing to diff is summarized without the LLM"""
+        events = [{"type": "info", "message": "No changes found to review."}]
+        with patch("agent.get_llm") as get_llm:
+            summary, _ = asyncio.run(self.agent._summarize_review_async(events))
+        get_llm.assert_not_called()
+        self.assertTrue(summary["green_signal"])
+
+
+TOOLS_CACHE_PATH = os.path.expanduser("~/.cache/ai-code-review-agent/tools.json")
+TOOLS_CACHE_TTL = 24 * 60 * 60  # seconds
+
+
+def _check_tools_cached(required_tools):
+    """Return the required tools that aren't usable, reusing a check from the last 24h for this interpreter."""
+    try:
+        with open(TOOLS_CACHE_PATH) as f:
+            cached = json.load(f)
+        if (cached["python"] == sys.executable and cached["tools"] == required_tools
+                and time.time() - cached["checked_at"] < TOOLS_CACHE_TTL):
+            return cached["missing"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    missing_tools = []
+    for tool in required_tools:
+        if shutil.which(tool) is None:
+            missing_tools.append(tool)  # not on PATH; no need to spawn it
+            continue
+        try:
+            subprocess.run([tool, "--version"], capture_output=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            missing_tools.append(tool)
+
+    try:
+        os.makedirs(os.path.dirname(TOOLS_CACHE_PATH), exist_ok=True)
+        with open(TOOLS_CACHE_PATH, "w") as f:
+            json.dump({"python": sys.executable, "tools": required_tools,
+                       "checked_at": time.time(), "missing": missing_tools}, f)
+    except OSError:
+        pass  # caching is best effort
+    return missing_tools
+
+
 def run_tests():
     """Run all tests"""
     # Create test suite using modern unittest approach
     test_suite = unittest.TestSuite()
-    
+
     # Add test classes using TestLoader
     loader = unittest.TestLoader()
     test_suite.addTest(loader.loadTestsFromTestCase(TestReviewAgent))
     test_suite.addTest(loader.loadTestsFromTestCase(TestReviewAgentIntegration))
-    
+    test_suite.addTest(loader.loadTestsFromTestCase(TestReviewSummary))
+
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(test_suite)
-    
+
     # Return exit code
     return 0 if result.wasSuccessful() else 1
 
@@ -381,21 +650,15 @@ def run_tests():
 if __name__ == "__main__":
     # Check if required tools are available
     required_tools = ["git", "flake8", "pylint", "autopep8"]
-    missing_tools = []
-    
-    for tool in required_tools:
-        try:
-            subprocess.run([tool, "--version"], capture_output=True, check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            missing_tools.append(tool)
-    
+    missing_tools = _check_tools_cached(required_tools)
+
     if missing_tools:
         print(f"Warning: The following tools are not available: {', '.join(missing_tools)}")
         print("Some tests may fail or be skipped.")
         print("To install missing tools:")
         print("  pip install flake8 pylint autopep8")
         print("  # Note: git should be installed separately")
-    
+
     # Try to run tests using the modern approach
     try:
         exit_code = run_tests()